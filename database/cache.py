@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+# Время жизни закэшированного списка лекций в секундах: оно ограничивает устаревание remaining_seats
+LECTURES_CACHE_TTL = float(os.getenv("LECTURES_CACHE_TTL", "2"))
+# Сколько разных страниц списка лекций (фильтры, курсор, поля) держать в кэше
+LECTURES_CACHE_SIZE = int(os.getenv("LECTURES_CACHE_SIZE", "256"))
+
+T = TypeVar("T")
+
+
+class _SingleFlight:
+    '''
+    Объединяет одновременные загрузки по одному ключу: load выполняет одна корутина,
+    остальные ждут её результат (или исключение). Отмена любого из ожидающих,
+    включая начавшего загрузку, не отменяет её.
+    '''
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: Hashable, load: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            # load выполняется в отдельной задаче: отмена любого вызывающего (в том числе первого)
+            # не прерывает загрузку, которую ждут остальные
+            task = asyncio.ensure_future(load())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Если все ожидающие отменены, исключение загрузки некому получить
+        if not task.cancelled():
+            task.exception()
+
+
+class LectureCatalogCache:
+    '''
+    Версионированный кэш страниц списка лекций в памяти процесса.
+
+    Для каждого набора параметров (LectureQuery) хранит уже сериализованное тело ответа
+    и его ETag, поэтому попадание в кэш не требует ни запросов к БД, ни сериализации.
+    Число закэшированных страниц ограничено maxsize (LRU). Запись в лекции
+    (create/update/delete) вызывает invalidate() и сбрасывает все страницы сразу,
+    а изменения remaining_seats подхватываются по истечении TTL.
+    '''
+
+    def __init__(self, ttl: float = LECTURES_CACHE_TTL, maxsize: int = LECTURES_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        # Ключ — параметры страницы, значение — (тело, ETag, момент загрузки)
+        self._entries: OrderedDict[Hashable, tuple[bytes, str, float]] = OrderedDict()
+        self._loads = _SingleFlight()
+
+    def _lookup(self, key: Hashable) -> Optional[tuple[bytes, str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        body, etag, loaded_at = entry
+        if time.monotonic() - loaded_at >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body, etag
+
+    def current_etag(self, key: Hashable) -> Optional[str]:
+        '''ETag актуальной записи кэша или None, если страницы нет в кэше или она устарела.'''
+        entry = self._lookup(key)
+        return entry[1] if entry is not None else None
+
+    def record_not_modified(self):
+        self.not_modified += 1
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[BaseModel]]) -> tuple[bytes, str]:
+        '''
+        Возвращает (тело ответа, ETag) страницы key. При промахе данные загружаются через loader
+        ровно одной корутиной на ключ, остальные ждут её результат. Модель, которую вернул loader,
+        сериализуется в JSON средствами pydantic (pydantic-core), без промежуточных словарей.
+        '''
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        async def load() -> tuple[bytes, str]:
+            version = self.version
+            data = await loader()
+            body = data.model_dump_json().encode("utf-8")
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+            # Если во время загрузки кэш инвалидировали, результат мог устареть — не сохраняем его
+            if version == self.version:
+                self._entries[key] = (body, etag, time.monotonic())
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            return body, etag
+
+        if key in self._loads:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return await self._loads.run(key, load)
+
+    def invalidate(self):
+        self.version += 1
+        self.invalidations += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "ttl": self.ttl,
+            "pages": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "invalidations": self.invalidations,
+            "cached_bytes": sum(len(body) for body, _, _ in self._entries.values()),
+        }
+
+
+lecture_catalog = LectureCatalogCache()
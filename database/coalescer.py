@@ -0,0 +1,165 @@
+import asyncio
+import os
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.future import select
+
+from database.db import async_session_maker
+from database.models import Lectures, LectureRegistrations, Users
+from database.results import RegistrationResult, RegistrationStatus
+from database.seat_feed import seat_feed
+
+# Окно накопления регистраций на одну лекцию в миллисекундах, 0 — объединение отключено
+REGISTRATION_COALESCE_MS = float(os.getenv("REGISTRATION_COALESCE_MS", "0"))
+REGISTRATION_COALESCE_MAX_BATCH = int(os.getenv("REGISTRATION_COALESCE_MAX_BATCH", "500"))
+
+
+class RegistrationCoalescer:
+    '''
+    Объединяет регистрации на одну лекцию, пришедшие в пределах окна window_ms,
+    в одну транзакцию: лекция блокируется один раз, пользователи и дубли ищутся одним запросом,
+    места раздаются в порядке поступления, победители записываются одним INSERT.
+    Каждый вызывающий получает свой RegistrationResult.
+    '''
+
+    def __init__(self, window_ms: float = REGISTRATION_COALESCE_MS, max_batch: int = REGISTRATION_COALESCE_MAX_BATCH):
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._pending: dict[int, list[tuple[int, asyncio.Future]]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def register(self, lecture_id: int, user_id: int) -> RegistrationResult:
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(lecture_id, [])
+        batch.append((user_id, future))
+        self.requests += 1
+
+        if len(batch) == 1:
+            self._spawn(self._flush_later(lecture_id, batch))
+        elif len(batch) >= self.max_batch:
+            del self._pending[lecture_id]
+            self._spawn(self._flush(lecture_id, batch))
+
+        return await future
+
+    async def _flush_later(self, lecture_id: int, batch: list):
+        await asyncio.sleep(self.window_ms / 1000)
+        # Пакет мог уже уйти в запись по достижении max_batch
+        if self._pending.get(lecture_id) is batch:
+            del self._pending[lecture_id]
+            await self._flush(lecture_id, batch)
+
+    async def _flush(self, lecture_id: int, batch: list[tuple[int, asyncio.Future]]):
+        self.batches += 1
+        try:
+            results = await self._apply(lecture_id, [user_id for user_id, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _apply(self, lecture_id: int, user_ids: list[int]) -> list[RegistrationResult]:
+        async with async_session_maker() as session:
+            async with session.begin():
+                lock_query = (
+                    select(Lectures.max_seats, Lectures.registered_count)
+                    .where(Lectures.id == lecture_id)
+                    .with_for_update()
+                )
+                lock_result = await session.execute(lock_query)
+                lecture = lock_result.one_or_none()
+
+                if lecture is None:
+                    return [RegistrationResult(RegistrationStatus.LECTURE_NOT_FOUND) for _ in user_ids]
+
+                existing_query = (
+                    select(Users.id, LectureRegistrations.id.label("registration_id"))
+                    .outerjoin(
+                        LectureRegistrations,
+                        (LectureRegistrations.user_id == Users.id) & (LectureRegistrations.lecture_id == lecture_id),
+                    )
+                    .where(Users.id.in_(set(user_ids)))
+                )
+                existing_result = await session.execute(existing_query)
+                existing_rows = existing_result.all()
+                known_users = {row.id for row in existing_rows}
+                registered = {row.id for row in existing_rows if row.registration_id is not None}
+
+                # Места раздаются в порядке поступления запросов
+                remaining = max(lecture.max_seats - lecture.registered_count, 0)
+                statuses = []
+                winners = []
+                for user_id in user_ids:
+                    if user_id not in known_users:
+                        statuses.append((RegistrationStatus.USER_NOT_FOUND, remaining))
+                    elif user_id in registered:
+                        statuses.append((RegistrationStatus.DUPLICATE, remaining))
+                    elif remaining > 0:
+                        registered.add(user_id)
+                        winners.append(user_id)
+                        remaining -= 1
+                        statuses.append((RegistrationStatus.REGISTERED, remaining))
+                    else:
+                        statuses.append((RegistrationStatus.FULL, 0))
+
+                if winners:
+                    inserted = (
+                        pg_insert(LectureRegistrations)
+                        .values([{"user_id": user_id, "lecture_id": lecture_id} for user_id in winners])
+                        .on_conflict_do_nothing(index_elements=["user_id", "lecture_id"])
+                        .returning(LectureRegistrations.user_id)
+                        .cte("inserted")
+                    )
+                    bump = (
+                        update(Lectures)
+                        .where(Lectures.id == lecture_id)
+                        .values(registered_count=Lectures.registered_count
+                                + select(func.count()).select_from(inserted).scalar_subquery())
+                        .returning(Lectures.id)
+                        .cte("bump")
+                    )
+                    insert_result = await session.execute(select(inserted.c.user_id).add_cte(bump))
+                    inserted_ids = set(insert_result.scalars().all())
+                else:
+                    inserted_ids = set()
+
+        # Места изменились: подписчики потока мест узнают об этом после фиксации пакета
+        if inserted_ids:
+            seat_feed.publish(lecture_id)
+
+        results = []
+        for user_id, (status, remaining_seats) in zip(user_ids, statuses):
+            # Под блокировкой конфликтов быть не должно, но не выдаём место, которое не записалось
+            if status is RegistrationStatus.REGISTERED and user_id not in inserted_ids:
+                status = RegistrationStatus.DUPLICATE
+            results.append(RegistrationResult(status, remaining_seats))
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_ms,
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch": self.requests / self.batches if self.batches else 0.0,
+        }
+
+
+registration_coalescer = RegistrationCoalescer()
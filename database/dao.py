@@ -1,242 +1,544 @@
-import os
-import uuid
-from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.future import select
-from sqlalchemy import func
-from database.db import async_session_maker
+from sqlalchemy import String, column, func, update, delete, true, tuple_, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.session import use_session, on_commit, on_rollback
+from database.cache import lecture_catalog
+from database.coalescer import registration_coalescer
+from database.seat_feed import seat_feed
+from database.leaderboard import leaderboard
+from database.lecture_query import LectureQuery, LECTURE_MAX_DURATION_HOURS, encode_cursor
+from database.timeutil import naive_utc, parse_utc, utc_now, utc_timestamp
 from database.models import Category, RegCommand, Users, Member, Lectures, LectureRegistrations
-from typing import Optional, Dict, Any
-from datetime import datetime
+from database.results import (RegistrationResult, RegistrationStatus, QrResult, QrStatus,
+                              TeamRegistrationResult, TeamRegistrationStatus, UserIdentity)
+from schemas.lecture_schemas import LectureIn, LectureOut, LecturePage, SeatUpdate, lecture_page_model
+from services.storage import save_upload, remove_upload
+from services.images import build_variants, select_variant
+from services.metrics import observe_dao
+from services.exports import EXPORT_BATCH_SIZE
+from services.tickets import (issue_ticket, verify_ticket, render_qr, ticket_cache, RenderedTicket,
+                              InvalidTicket, QR_MEDIA_TYPES, TICKET_GRACE_SECONDS)
+from typing import AsyncIterator, Optional, Dict, Any, Sequence
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора до завершения
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _run_in_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# Колонки для каждого поля списка лекций (database.lecture_query.LECTURE_FIELDS)
+_LECTURE_COLUMNS = {
+    "id": Lectures.id,
+    "title": Lectures.title,
+    "speaker": Lectures.speaker,
+    "date": Lectures.date,
+    "end_time": Lectures.end_time,
+    "max_seats": Lectures.max_seats,
+    "remaining_seats": (Lectures.max_seats - Lectures.registered_count).label("remaining_seats"),
+    "format": Lectures.format,
+    "conference_link": Lectures.conference_link,
+    "offline_map_link": Lectures.offline_map_link,
+    "offline_photo": Lectures.offline_photo,
+}
 
 
 class BaseDAO:
 
     @staticmethod
-    async def check_auth(first_name: str, last_name: str, user_tg: str, username_tg: str):
+    @observe_dao
+    async def check_auth(first_name: str, last_name: str, user_tg: str, username_tg: str,
+                         session: Optional[AsyncSession] = None) -> UserIdentity:
         f'''
-        Метод, который проверят тип пользователя
+        Вход пользователя одним запросом INSERT ... ON CONFLICT (user_tg) DO UPDATE ... RETURNING:
+        новый пользователь создаётся, у существующего обновляются имя и username_tg.
+        Одновременные входы одного пользователя не конфликтуют, флаг is_admin не меняется.
 
         Аргументы:
             - first_name
             - last_name
-            - tg_id
+            - user_tg: Telegram ID пользователя
+            - username_tg: Telegram username пользователя
+            - session: сессия запроса (None — метод открывает свою)
 
-        Вохвращает: 
-            - True - пользователь админ 
-            - False - пользователь обычный
+        Возвращает:
+            Снимок пользователя UserIdentity; is_admin — признак администратора.
         '''
+        user_name = f"{first_name} {last_name}".strip()
+        insert_query = pg_insert(Users).values(user_name=user_name,
+                                               user_tg=user_tg,
+                                               is_admin=False,
+                                               username_tg=username_tg,
+                                               )
+        query = (
+            insert_query
+            .on_conflict_do_update(
+                index_elements=["user_tg"],
+                set_={"user_name": insert_query.excluded.user_name,
+                      "username_tg": insert_query.excluded.username_tg},
+            )
+            .returning(Users.id, Users.user_name, Users.user_tg, Users.username_tg, Users.is_admin, Users.score)
+        )
 
-        async with async_session_maker() as session: 
-            query = select(Users).filter_by(user_tg=username_tg)
+        async with use_session(session) as session:
             result = await session.execute(query)
-            user = result.scalar_one_or_none()
+            row = result.one()
+            identity = UserIdentity(id=row.id,
+                                    user_name=row.user_name,
+                                    user_tg=row.user_tg,
+                                    username_tg=row.username_tg,
+                                    is_admin=row.is_admin)
+            # Новый пользователь появляется в рейтинге сразу, у существующего обновляется имя
+            on_commit(session, lambda: leaderboard.update(row.id, row.score, row.user_name))
+
+        return identity
 
-            if user.is_admin: 
-                return user.is_admin
-            else: 
-                user_name = f"{first_name} {last_name}".stripe()
-                new_user = Users(user_name=user_name,
-                                 user_tg=user_tg,
-                                 is_admin=False,
-                                 username_tg=username_tg, 
-                                 )
-                session.add(new_user)
-                await session.commit()
-                return new_user.is_admin
-    
 
     @staticmethod
-    async def get_all_lectures():
+    @observe_dao
+    async def get_all_lectures(query: LectureQuery = LectureQuery(),
+                               session: Optional[AsyncSession] = None) -> LecturePage:
         f'''
-        Получение списка всех лекций с количеством оставшихся мест и новыми полями.
+        Страница списка лекций с фильтрами, keyset-пагинацией по (date, id) и выбором полей.
+
+        По умолчанию прошедшие лекции не показываются; страница читается по индексу
+        ix_lectures_date_id, поэтому стоимость запроса не растёт вместе с архивом лекций.
+        Из БД читаются только запрошенные колонки.
+
+        Аргументы:
+            - query: фильтры, курсор, размер страницы и поля (LectureQuery).
+            - session: сессия запроса (None — метод открывает свою, только на чтение).
 
         Возвращает:
-            Список лекций с полями: id, title, speaker, date, end_time, max_seats, remaining_seats,
-            format, conference_link, offline_map_link, offline_photo.
+            LecturePage (модель проекции lecture_page_model): items — лекции с полями query.fields
+            (remaining_seats считается по счётчику registered_count), next_cursor — курсор
+            следующей страницы или None.
         '''
-        async with async_session_maker() as session:
-            subquery = (
-                select(LectureRegistrations.lecture_id, func.count().label("registration_count"))
-                .group_by(LectureRegistrations.lecture_id)
-                .subquery()
-            )
+        columns = [_LECTURE_COLUMNS[field] for field in query.fields]
+        statement = select(*columns, Lectures.date.label("cursor_date"), Lectures.id.label("cursor_id"))
+
+        if not query.include_past:
+            now = utc_now()
+            # Нижняя граница по date держит поиск в индексе, end_time отсекает уже закончившиеся
+            statement = statement.where(Lectures.date >= now - timedelta(hours=LECTURE_MAX_DURATION_HOURS),
+                                        Lectures.end_time >= now)
+        if query.date_from is not None:
+            statement = statement.where(Lectures.date >= query.date_from)
+        if query.date_to is not None:
+            statement = statement.where(Lectures.date < query.date_to)
+        if query.format is not None:
+            statement = statement.where(Lectures.format == query.format)
+        if query.has_seats:
+            statement = statement.where(Lectures.registered_count < Lectures.max_seats)
+        if query.after is not None:
+            statement = statement.where(tuple_(Lectures.date, Lectures.id) > tuple_(*query.after))
+
+        # Лишняя строка показывает, есть ли следующая страница
+        statement = statement.order_by(Lectures.date, Lectures.id).limit(query.limit + 1)
+
+        async with use_session(session, read_only=True) as session:
+            result = await session.execute(statement)
+            rows = result.all()
+
+        next_cursor = None
+        if len(rows) > query.limit:
+            rows = rows[:query.limit]
+            next_cursor = encode_cursor(rows[-1].cursor_date, rows[-1].cursor_id)
+
+        return lecture_page_model(query.fields).model_validate(
+            {"items": [row._asdict() for row in rows], "next_cursor": next_cursor}
+        )
 
-            query = (
-                select(
-                    Lectures,
-                    (Lectures.max_seats - func.coalesce(subquery.c.registration_count, 0)).label("remaining_seats")
-                )
-                .outerjoin(subquery, Lectures.id == subquery.c.lecture_id)
-            )
 
+    @staticmethod
+    @observe_dao
+    async def get_seat_updates(lecture_ids: list[int], session: Optional[AsyncSession] = None) -> list[SeatUpdate]:
+        f'''
+        Свободные места нескольких лекций одним запросом по первичному ключу — для потока изменений мест.
+
+        Аргументы:
+            - lecture_ids: ID лекций.
+            - session: сессия запроса (None — метод открывает свою, только на чтение).
+
+        Возвращает:
+            Список SeatUpdate найденных лекций; удалённых лекций в нём нет.
+        '''
+        query = (
+            select(Lectures.id, _LECTURE_COLUMNS["remaining_seats"], Lectures.max_seats)
+            .where(Lectures.id.in_(lecture_ids))
+        )
+        async with use_session(session, read_only=True) as session:
             result = await session.execute(query)
-            lectures = result.all()
-
-            return [
-                {
-                    "id": lecture.Lectures.id,
-                    "title": lecture.Lectures.title,
-                    "speaker": lecture.Lectures.speaker,
-                    "date": lecture.Lectures.date,
-                    "end_time": lecture.Lectures.end_time,
-                    "max_seats": lecture.Lectures.max_seats,
-                    "remaining_seats": lecture.remaining_seats,
-                    "format": lecture.Lectures.format,
-                    "conference_link": lecture.Lectures.conference_link,
-                    "offline_map_link": lecture.Lectures.offline_map_link,
-                    "offline_photo": lecture.Lectures.offline_photo
-                }
-                for lecture in lectures
-            ]
+            return [SeatUpdate(id=row.id, remaining_seats=row.remaining_seats, max_seats=row.max_seats)
+                    for row in result.all()]
 
 
     @staticmethod
-    async def register_for_lecture(lecture_id: int, username_tg: str):
+    @observe_dao
+    async def register_for_lecture(lecture_id: int, user_id: int,
+                                   session: Optional[AsyncSession] = None) -> RegistrationResult:
         f'''
         Регистрация пользователя на лекцию.
 
+        Строка лекции блокируется (SELECT ... FOR UPDATE), поэтому конкурентные регистрации
+        на одну лекцию выполняются по очереди, а проверка мест и вставка атомарны.
+        В БД всего два запроса: блокировка лекции с чтением счётчика registered_count
+        и проверкой пользователя и его регистрации, затем вставка регистрации вместе с увеличением счётчика.
+        Порядок проверок: лекция, пользователь, повторная регистрация, свободные места.
+
         Аргументы:
             - lecture_id: ID лекции.
-            - tg_id: Telegram ID пользователя.
+            - user_id: ID пользователя из сессии.
+            - session: сессия запроса (None — метод открывает свою).
 
         Возвращает:
-            Кортеж (сообщение, флаг успешной регистрации).
+            RegistrationResult со статусом registered / full / duplicate / user_not_found / lecture_not_found.
         '''
-        async with async_session_maker() as session:
-            user_query = select(Users).filter_by(username_tg=username_tg)
-            user_result = await session.execute(user_query)
-            user = user_result.scalar_one_or_none()
+        # В пиковые моменты регистрации на одну лекцию можно объединять в пакеты (REGISTRATION_COALESCE_MS).
+        # Пакет пишется в собственной транзакции объединителя, а не в сессии запроса
+        if registration_coalescer.enabled:
+            return await registration_coalescer.register(lecture_id, user_id)
+
+        async with use_session(session) as session:
+            user_exists = select(Users.id).where(Users.id == user_id).exists().label("user_exists")
+            already_registered = (
+                select(LectureRegistrations.id)
+                .where(LectureRegistrations.lecture_id == lecture_id, LectureRegistrations.user_id == user_id)
+                .exists()
+                .label("already_registered")
+            )
+            lock_query = (
+                select(Lectures.max_seats, Lectures.registered_count, user_exists, already_registered)
+                .where(Lectures.id == lecture_id)
+                .with_for_update(of=Lectures)
+            )
+            lock_result = await session.execute(lock_query)
+            row = lock_result.one_or_none()
 
-            if not user:
-                return "Пользователь не найден", False
+            if row is None:
+                return RegistrationResult(RegistrationStatus.LECTURE_NOT_FOUND)
 
-            lecture_query = select(Lectures).filter_by(id=lecture_id)
-            lecture_result = await session.execute(lecture_query)
-            lecture = lecture_result.scalar_one_or_none()
+            # Сессия могла пережить пользователя; вставка упала бы на внешнем ключе
+            if not row.user_exists:
+                return RegistrationResult(RegistrationStatus.USER_NOT_FOUND)
 
-            if not lecture:
-                return "Лекция не найдена", False
+            remaining_seats = max(row.max_seats - row.registered_count, 0)
 
-            registration_query = select(LectureRegistrations).filter_by(user_id=user.id, lecture_id=lecture_id)
-            registration_result = await session.execute(registration_query)
-            existing_registration = registration_result.scalar_one_or_none()
+            # Уже зарегистрированный пользователь получает DUPLICATE и на заполненной лекции
+            if row.already_registered:
+                return RegistrationResult(RegistrationStatus.DUPLICATE, remaining_seats)
 
-            if existing_registration:
-                return "Вы уже зарегистрированы на эту лекцию", False
+            if remaining_seats <= 0:
+                return RegistrationResult(RegistrationStatus.FULL, 0)
+
+            # Уникальный индекс (user_id, lecture_id) страхует от дубля: при конфликте строка не вставляется
+            inserted = (
+                pg_insert(LectureRegistrations)
+                .values(user_id=user_id, lecture_id=lecture_id)
+                .on_conflict_do_nothing(index_elements=["user_id", "lecture_id"])
+                .returning(LectureRegistrations.lecture_id)
+                .cte("inserted")
+            )
+            reserve_query = (
+                update(Lectures)
+                .where(Lectures.id == inserted.c.lecture_id)
+                .values(registered_count=Lectures.registered_count + 1)
+                .returning((Lectures.max_seats - Lectures.registered_count).label("remaining_seats"))
+                .execution_options(synchronize_session=False)
+            )
+            reserve_result = await session.execute(reserve_query)
+            remaining_after = reserve_result.scalar_one_or_none()
+            if remaining_after is not None:
+                on_commit(session, lambda: seat_feed.publish(lecture_id))
 
-            registration_count_query = select(func.count()).select_from(LectureRegistrations).filter_by(lecture_id=lecture_id)
-            registration_count_result = await session.execute(registration_count_query)
-            registration_count = registration_count_result.scalar() or 0
+        if remaining_after is None:
+            return RegistrationResult(RegistrationStatus.DUPLICATE, remaining_seats)
 
-            remaining_seats = lecture.max_seats - registration_count
+        return RegistrationResult(RegistrationStatus.REGISTERED, remaining_after)
 
-            if remaining_seats <= 0:
-                return "Места на лекцию закончились", False
 
-            new_registration = LectureRegistrations(user_id=user.id, lecture_id=lecture_id)
-            session.add(new_registration)
-            await session.commit()
-            return "Вы успешно зарегистрированы на лекцию", True
+    @staticmethod
+    @observe_dao
+    async def unregister_from_lecture(lecture_id: int, user_id: int, session: Optional[AsyncSession] = None) -> bool:
+        f'''
+        Отмена регистрации пользователя на лекцию.
+
+        Удаление регистрации и уменьшение счётчика registered_count выполняются одним запросом.
+
+        Аргументы:
+            - lecture_id: ID лекции.
+            - user_id: ID пользователя из сессии.
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            True, если регистрация отменена, False, если регистрации не было.
+        '''
+        async with use_session(session) as session:
+            deleted = (
+                delete(LectureRegistrations)
+                .where(LectureRegistrations.lecture_id == lecture_id, LectureRegistrations.user_id == user_id)
+                .returning(LectureRegistrations.id)
+                .cte("deleted")
+            )
+            deleted_count = select(func.count()).select_from(deleted).scalar_subquery()
+            release_query = (
+                update(Lectures)
+                .where(Lectures.id == lecture_id, select(deleted.c.id).exists())
+                .values(registered_count=Lectures.registered_count - deleted_count)
+                .returning(Lectures.id)
+                .execution_options(synchronize_session=False)
+            )
+            release_result = await session.execute(release_query)
+            released = release_result.scalar_one_or_none() is not None
+            if released:
+                on_commit(session, lambda: seat_feed.publish(lecture_id))
+
+            # Выданный билет больше не показываем; на входе его отсекает проверка регистрации
+            on_commit(session, lambda: ticket_cache.discard(user_id, lecture_id))
+
+        return released
 
 
     @staticmethod
-    async def check_registration_and_get_qr(lecture_id: int, username_tg: str):
+    @observe_dao
+    async def check_registration_and_get_qr(lecture_id: int, user_id: int, fmt: str = "png",
+                                            session: Optional[AsyncSession] = None) -> QrResult:
         f'''
         Проверка регистрации пользователя на лекцию и получение QR-кода.
 
+        QR-код кодирует подписанный HMAC билет (user_id, lecture_id, срок действия), который
+        проверяется на входе без обращения к БД. Выданные билеты с картинками кэшируются:
+        в течение QR_CACHE_RECHECK секунд повторное открытие QR не делает ни запросов к БД,
+        ни отрисовки, затем билет сверяется с БД и при неизменном окне действия не перерисовывается.
+
         Аргументы:
             - lecture_id: ID лекции.
-            - username_tg: Telegram username пользователя.
+            - user_id: ID пользователя из сессии.
+            - fmt: формат картинки, "png" или "svg".
+            - session: сессия запроса (None — метод открывает свою, только на чтение).
 
         Возвращает:
-            Сообщение (либо заглушка, либо QR-код, если он будет реализован).
+            QrResult со статусом и, если билет выдан, токеном и картинкой QR-кода.
         '''
-        async with async_session_maker() as session:
-            user_query = select(Users).filter_by(username_tg=username_tg)
-            user_result = await session.execute(user_query)
-            user = user_result.scalar_one_or_none()
+        cached = ticket_cache.get(user_id, lecture_id, fmt)
+        if cached is not None:
+            return QrResult(QrStatus.ISSUED, cached.token, cached.image, cached.media_type)
+        cached = ticket_cache.peek(user_id, lecture_id, fmt)
+
+        async with use_session(session, read_only=True) as session:
+            query = (
+                select(Lectures.date, Lectures.end_time, LectureRegistrations.id.label("registration_id"))
+                .outerjoin(
+                    LectureRegistrations,
+                    (LectureRegistrations.lecture_id == Lectures.id) & (LectureRegistrations.user_id == user_id),
+                )
+                .where(Lectures.id == lecture_id)
+            )
+            result = await session.execute(query)
+            lecture = result.one_or_none()
 
-            if not user:
-                return "Пользователь не найден"
+        if not lecture or lecture.registration_id is None:
+            # Лекцию удалили или регистрацию отменили, возможно, в другом воркере
+            ticket_cache.discard(user_id, lecture_id)
+            if not lecture:
+                return QrResult(QrStatus.LECTURE_NOT_FOUND)
+            return QrResult(QrStatus.NOT_REGISTERED)
 
-            registration_query = select(LectureRegistrations).filter_by(user_id=user.id, lecture_id=lecture_id)
-            registration_result = await session.execute(registration_query)
-            registration = registration_result.scalar_one_or_none()
+        # Билет действует с начала дня лекции до её окончания с запасом
+        not_before = datetime.combine(lecture.date.date(), datetime.min.time())
+        expires = utc_timestamp(lecture.end_time) + TICKET_GRACE_SECONDS
 
-            if not registration:
-                return "Вы не зарегистрированы на эту лекцию"
+        if utc_now() < not_before:
+            return QrResult(QrStatus.NOT_YET_AVAILABLE)
 
-            lecture_query = select(Lectures).filter_by(id=lecture_id)
-            lecture_result = await session.execute(lecture_query)
-            lecture = lecture_result.scalar_one_or_none()
+        if time.time() > expires:
+            return QrResult(QrStatus.EXPIRED)
 
-            if not lecture:
-                return "Лекция не найдена"
+        not_before_ts = utc_timestamp(not_before)
+        if cached is not None and (cached.not_before, cached.expires) == (not_before_ts, expires):
+            # Регистрация на месте и время лекции не менялось: тот же токен, картинка уже есть
+            ticket = cached.confirmed()
+        else:
+            token = issue_ticket(user_id, lecture_id, not_before_ts, expires)
+            image = await render_qr(token, fmt)
+            ticket = RenderedTicket(token=token, image=image, media_type=QR_MEDIA_TYPES[fmt],
+                                    not_before=not_before_ts, expires=expires, checked_at=time.monotonic())
+        ticket_cache.put(user_id, lecture_id, fmt, ticket)
+        return QrResult(QrStatus.ISSUED, ticket.token, ticket.image, ticket.media_type)
 
-            current_date = datetime.now().date()
-            lecture_date = lecture.date.date()
 
-            if current_date < lecture_date:
-                return "QR-код будет доступен в день лекции"
+    @staticmethod
+    @observe_dao
+    async def check_in_tickets(tokens: list[str], lecture_id: Optional[int] = None,
+                               session: Optional[AsyncSession] = None) -> list[dict]:
+        f'''
+        Пакетная отметка прохода по отсканированным QR-билетам.
+
+        Подписи проверяются без БД, затем одним запросом для всех билетов сразу
+        находятся регистрации (отменённые отсекаются) и проставляется checked_in_at
+        тем, кто ещё не проходил. Повторная отправка того же пакета безопасна:
+        уже отмеченные билеты возвращаются со статусом already_checked_in и исходным временем.
+
+        Аргументы:
+            - tokens: отсканированные билеты (дубли допускаются).
+            - lecture_id: ID лекции, на входе которой стоит сканер (None — любая лекция).
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            Результаты в порядке tokens: token, status (checked_in / already_checked_in /
+            not_registered / wrong_lecture / invalid), reason, user_id, lecture_id, checked_in_at.
+        '''
+        results = []
+        claims_by_token = {}
+        for token in tokens:
+            result = {"token": token, "status": "invalid", "reason": None,
+                      "user_id": None, "lecture_id": None, "checked_in_at": None}
+            try:
+                claims = verify_ticket(token)
+            except InvalidTicket as e:
+                result["reason"] = e.reason
             else:
-                return "QR-код будет доступен в день лекции"  # Заглушка
+                result["user_id"], result["lecture_id"] = claims.user_id, claims.lecture_id
+                if lecture_id is not None and claims.lecture_id != lecture_id:
+                    result["status"] = "wrong_lecture"
+                else:
+                    claims_by_token[token] = claims
+            results.append(result)
+
+        pairs = {(claims.user_id, claims.lecture_id) for claims in claims_by_token.values()}
+        if not pairs:
+            return results
+
+        now = utc_now()
+        async with use_session(session) as session:
+            existing = (
+                select(LectureRegistrations.id, LectureRegistrations.user_id,
+                       LectureRegistrations.lecture_id, LectureRegistrations.checked_in_at)
+                .where(tuple_(LectureRegistrations.user_id, LectureRegistrations.lecture_id).in_(list(pairs)))
+                .cte("existing")
+            )
+            marked = (
+                update(LectureRegistrations)
+                .where(LectureRegistrations.id == existing.c.id, LectureRegistrations.checked_in_at.is_(None))
+                .values(checked_in_at=now)
+                .returning(LectureRegistrations.id)
+                .cte("marked")
+            )
+            query = (
+                select(existing.c.user_id, existing.c.lecture_id, existing.c.checked_in_at,
+                       marked.c.id.is_not(None).label("first_scan"))
+                .outerjoin(marked, marked.c.id == existing.c.id)
+            )
+            result = await session.execute(query)
+            registrations = {(row.user_id, row.lecture_id): row for row in result.all()}
+
+        for result in results:
+            claims = claims_by_token.get(result["token"])
+            if claims is None:
+                continue
+            row = registrations.get((claims.user_id, claims.lecture_id))
+            if row is None:
+                result["status"] = "not_registered"
+            elif row.first_scan:
+                result["status"], result["checked_in_at"] = "checked_in", now
+            else:
+                # checked_in_at пуст, если параллельный сканер отметил билет в эту же секунду
+                result["status"], result["checked_in_at"] = "already_checked_in", row.checked_in_at or now
+
+        return results
 
 
     @staticmethod
-    async def create_lecture(lecture_data: Dict[str, Any], offline_photo: Optional[Any] = None) -> Dict[str, Any]:
+    @observe_dao
+    async def create_lecture(lecture_data: Dict[str, Any], offline_photo: Optional[Any] = None,
+                             session: Optional[AsyncSession] = None) -> LectureOut:
         f'''
         Создание новой лекции с поддержкой загрузки файла offline_photo.
 
         Аргументы:
             - lecture_data: Словарь с данными лекции.
             - offline_photo: Загруженный файл (UploadFile) или None.
+            - session: сессия запроса (None — метод открывает свою).
 
         Возвращает:
-            Данные созданной лекции с remaining_seats.
+            LectureOut созданной лекции.
         '''
-        async with async_session_maker() as session:
-            # Преобразуем строки date и end_time в объекты datetime
-            if isinstance(lecture_data.get("date"), str):
-                lecture_data["date"] = datetime.fromisoformat(lecture_data["date"].replace("Z", "+00:00"))
-            if isinstance(lecture_data.get("end_time"), str):
-                lecture_data["end_time"] = datetime.fromisoformat(lecture_data["end_time"].replace("Z", "+00:00"))
-
-            # Обрабатываем загрузку файла
-            offline_photo_path = None
-            if offline_photo:
-                upload_dir = "uploads"
-                os.makedirs(upload_dir, exist_ok=True)
-                file_extension = offline_photo.filename.split('.')[-1]
-                file_name = f"{uuid.uuid4()}.{file_extension}"
-                file_path = os.path.join(upload_dir, file_name)
-                with open(file_path, "wb") as f:
-                    f.write(await offline_photo.read())
-                offline_photo_path = f"/{file_path}"
-
-            # Если файл загружен, обновляем lecture_data
-            lecture_data["offline_photo"] = offline_photo_path or lecture_data.get("offline_photo")
-
+        # Преобразуем date и end_time в наивный UTC, в котором хранятся колонки дат
+        for key in ("date", "end_time"):
+            if isinstance(lecture_data.get(key), str):
+                lecture_data[key] = parse_utc(lecture_data[key])
+            elif isinstance(lecture_data.get(key), datetime):
+                lecture_data[key] = naive_utc(lecture_data[key])
+
+        # Обрабатываем загрузку файла: потоковая запись вне цикла событий, до открытия сессии
+        offline_photo_path = None
+        if offline_photo:
+            offline_photo_path = await save_upload(offline_photo)
+
+        # Если файл загружен, обновляем lecture_data
+        lecture_data["offline_photo"] = offline_photo_path or lecture_data.get("offline_photo")
+        # Счётчик регистраций и производные фото ведёт только DAO
+        lecture_data.pop("registered_count", None)
+        lecture_data.pop("remaining_seats", None)
+        lecture_data.pop("offline_photo_variants", None)
+
+        async with use_session(session) as session:
+            # Файл уже на диске: при откате транзакции он никому не нужен
+            on_rollback(session, lambda: remove_upload(offline_photo_path))
             new_lecture = Lectures(**lecture_data)
             session.add(new_lecture)
-            await session.commit()
+            await session.flush()
             await session.refresh(new_lecture)
-            return {
-                "id": new_lecture.id,
-                "title": new_lecture.title,
-                "speaker": new_lecture.speaker,
-                "date": new_lecture.date,
-                "end_time": new_lecture.end_time,
-                "max_seats": new_lecture.max_seats,
-                "remaining_seats": new_lecture.max_seats,  # Новая лекция, регистраций пока нет
-                "format": new_lecture.format,
-                "conference_link": new_lecture.conference_link,
-                "offline_map_link": new_lecture.offline_map_link,
-                "offline_photo": new_lecture.offline_photo
-            }
+            on_commit(session, lecture_catalog.invalidate)
+
+            if offline_photo_path:
+                on_commit(session, lambda: _run_in_background(
+                    BaseDAO.generate_photo_variants(new_lecture.id, offline_photo_path)))
+            return LectureOut.model_validate(new_lecture)
+
+
+    @staticmethod
+    @observe_dao
+    async def create_lectures(lectures: list[LectureIn], session: Optional[AsyncSession] = None) -> list[LectureOut]:
+        f'''
+        Массовое создание лекций одним многострочным INSERT ... RETURNING в одной транзакции.
+        Лекции должны быть уже проверены (LectureIn): пакет записывается целиком или не записывается вовсе.
+
+        Аргументы:
+            - lectures: проверенные лекции.
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            LectureOut созданных лекций в порядке lectures.
+        '''
+        query = (
+            pg_insert(Lectures)
+            .values([lecture.model_dump() for lecture in lectures])
+            .returning(*_LECTURE_COLUMNS.values())
+        )
+        async with use_session(session) as session:
+            result = await session.execute(query)
+            # Postgres отдаёт RETURNING однострочными VALUES по порядку; id растут в том же порядке
+            created = [LectureOut.model_validate(row._asdict()) for row in result.all()]
+            on_commit(session, lecture_catalog.invalidate)
+
+        return created
 
 
     @staticmethod
-    async def update_lecture(lecture_id: int, lecture_data: Dict[str, Any], offline_photo: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+    @observe_dao
+    async def update_lecture(lecture_id: int, lecture_data: Dict[str, Any], offline_photo: Optional[Any] = None,
+                             session: Optional[AsyncSession] = None) -> Optional[LectureOut]:
         f'''
         Обновление данных лекции с поддержкой загрузки файла offline_photo.
 
@@ -244,123 +546,440 @@ class BaseDAO:
             - lecture_id: ID лекции.
             - lecture_data: Словарь с обновленными данными.
             - offline_photo: Загруженный файл (UploadFile) или None.
+            - session: сессия запроса (None — метод открывает свою).
 
         Возвращает:
-            Данные обновленной лекции с remaining_seats или None, если лекция не найдена.
+            LectureOut обновленной лекции или None, если лекция не найдена.
         '''
-        async with async_session_maker() as session:
+        # Преобразуем date и end_time в наивный UTC, в котором хранятся колонки дат
+        for key in ("date", "end_time"):
+            if isinstance(lecture_data.get(key), str):
+                lecture_data[key] = parse_utc(lecture_data[key])
+            elif isinstance(lecture_data.get(key), datetime):
+                lecture_data[key] = naive_utc(lecture_data[key])
+
+        # Как и в create_lecture, файл пишется до открытия сессии: соединение и строка лекции
+        # не удерживаются на время загрузки
+        new_photo_path = None
+        if offline_photo:
+            new_photo_path = await save_upload(offline_photo)
+
+        async with use_session(session) as session:
+            on_rollback(session, lambda: remove_upload(new_photo_path))
             query = select(Lectures).filter_by(id=lecture_id)
             result = await session.execute(query)
             lecture = result.scalar_one_or_none()
 
             if not lecture:
+                await remove_upload(new_photo_path)
                 return None
 
-            # Преобразуем строки date и end_time в объекты datetime
-            if isinstance(lecture_data.get("date"), str):
-                lecture_data["date"] = datetime.fromisoformat(lecture_data["date"].replace("Z", "+00:00"))
-            if isinstance(lecture_data.get("end_time"), str):
-                lecture_data["end_time"] = datetime.fromisoformat(lecture_data["end_time"].replace("Z", "+00:00"))
-
-            # Обрабатываем загрузку нового файла
-            if offline_photo:
-                upload_dir = "uploads"
-                os.makedirs(upload_dir, exist_ok=True)
-                file_extension = offline_photo.filename.split('.')[-1]
-                file_name = f"{uuid.uuid4()}.{file_extension}"
-                file_path = os.path.join(upload_dir, file_name)
-                with open(file_path, "wb") as f:
-                    f.write(await offline_photo.read())
-                lecture_data["offline_photo"] = f"/{file_path}"
+            old_photo = lecture.offline_photo
+            old_variants = lecture.offline_photo_variants
+            if new_photo_path:
+                lecture_data["offline_photo"] = new_photo_path
             else:
                 lecture_data["offline_photo"] = lecture_data.get("offline_photo", lecture.offline_photo)
 
+            # Счётчик регистраций и производные фото ведёт только DAO
+            lecture_data.pop("registered_count", None)
+            lecture_data.pop("remaining_seats", None)
+            lecture_data.pop("offline_photo_variants", None)
+
             for key, value in lecture_data.items():
                 setattr(lecture, key, value)
 
-            await session.commit()
+            photo_replaced = lecture.offline_photo != old_photo
+            if photo_replaced:
+                lecture.offline_photo_variants = None
+
+            await session.flush()
             await session.refresh(lecture)
+            on_commit(session, lecture_catalog.invalidate)
+            # Могла измениться вместимость лекции
+            on_commit(session, lambda: seat_feed.publish(lecture_id))
+            # Могло измениться время лекции, а с ним окно действия билетов
+            on_commit(session, lambda: ticket_cache.discard_lecture(lecture_id))
+
+            # Старое фото и его производные больше не используются
+            if photo_replaced:
+                on_commit(session, lambda: remove_upload(old_photo))
+                for variant in old_variants or []:
+                    on_commit(session, lambda path=variant["path"]: remove_upload(path))
+
+            if new_photo_path:
+                on_commit(session, lambda: _run_in_background(
+                    BaseDAO.generate_photo_variants(lecture.id, new_photo_path)))
 
-            registration_count_query = select(func.count()).select_from(LectureRegistrations).filter_by(lecture_id=lecture_id)
-            registration_count_result = await session.execute(registration_count_query)
-            registration_count = registration_count_result.scalar() or 0
-            remaining_seats = lecture.max_seats - registration_count
-
-            return {
-                "id": lecture.id,
-                "title": lecture.title,
-                "speaker": lecture.speaker,
-                "date": lecture.date,
-                "end_time": lecture.end_time,
-                "max_seats": lecture.max_seats,
-                "remaining_seats": remaining_seats,
-                "format": lecture.format,
-                "conference_link": lecture.conference_link,
-                "offline_map_link": lecture.offline_map_link,
-                "offline_photo": lecture.offline_photo
-            }
+            return LectureOut.model_validate(lecture)
 
 
     @staticmethod
-    async def delete_lecture(lecture_id: int) -> bool:
+    @observe_dao
+    async def delete_lecture(lecture_id: int, session: Optional[AsyncSession] = None) -> bool:
         f'''
         Удаление лекции по ID с удалением связанного файла offline_photo.
 
         Аргументы:
             - lecture_id: ID лекции.
+            - session: сессия запроса (None — метод открывает свою).
 
         Возвращает:
             True, если удаление успешно, False, если лекция не найдена.
         '''
-        async with async_session_maker() as session:
-            query = select(Lectures).filter_by(id=lecture_id)
+        async with use_session(session) as session:
+            # Регистрации удаляются вместе с лекцией, счётчик уходит вместе со строкой лекции
+            await session.execute(delete(LectureRegistrations).where(LectureRegistrations.lecture_id == lecture_id))
+            query = (
+                delete(Lectures)
+                .where(Lectures.id == lecture_id)
+                .returning(Lectures.offline_photo, Lectures.offline_photo_variants)
+            )
             result = await session.execute(query)
-            lecture = result.scalar_one_or_none()
+            deleted = result.one_or_none()
 
-            if not lecture:
+            if deleted is None:
                 return False
 
-            # Удаляем файл, если он есть
-            if lecture.offline_photo:
-                file_path = lecture.offline_photo.lstrip('/')
-                if os.path.exists(file_path):
-                    os.remove(file_path)
+            on_commit(session, lecture_catalog.invalidate)
+            on_commit(session, lambda: seat_feed.publish(lecture_id))
+            # Выданные билеты на удалённую лекцию больше не показываем
+            on_commit(session, lambda: ticket_cache.discard_lecture(lecture_id))
+
+            # Удаляем файл и его производные, если они есть, только после фиксации удаления
+            on_commit(session, lambda: remove_upload(deleted.offline_photo))
+            for variant in deleted.offline_photo_variants or []:
+                on_commit(session, lambda path=variant["path"]: remove_upload(path))
 
-            await session.delete(lecture)
-            await session.commit()
             return True
         
         
     @staticmethod
-    async def find_user_by_tg_id(username_tg: str) -> Optional[Users]:
+    @observe_dao
+    async def generate_photo_variants(lecture_id: int, photo_path: str) -> list[dict]:
+        f'''
+        Построение производных фото лекции (миниатюра, WebP/JPEG нескольких ширин) в пуле процессов
+        и сохранение их путей в offline_photo_variants.
+
+        Аргументы:
+            - lecture_id: ID лекции.
+            - photo_path: публичный путь исходного фото (/uploads/...).
+
+        Возвращает:
+            Список сохранённых вариантов или пустой список, если фото лекции успели заменить.
+        '''
+        try:
+            variants = await build_variants(photo_path)
+        except Exception:
+            logger.exception(f'Не удалось построить производные фото {photo_path} лекции {lecture_id}')
+            return []
+
+        # Фоновая задача: всегда своя транзакция, не связанная с запросом
+        async with use_session() as session:
+            # Фото могли заменить или удалить, пока строились производные
+            query = (
+                update(Lectures)
+                .where(Lectures.id == lecture_id, Lectures.offline_photo == photo_path)
+                .values(offline_photo_variants=variants)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(query)
+
+        if result.rowcount == 0:
+            for variant in variants:
+                await remove_upload(variant["path"])
+            return []
+
+        return variants
+
+
+    @staticmethod
+    @observe_dao
+    async def get_lecture_photo(lecture_id: int, width: Optional[int] = None, accept_webp: bool = False,
+                                session: Optional[AsyncSession] = None) -> Optional[str]:
+        f'''
+        Получение пути к фото лекции подходящего размера.
+
+        Аргументы:
+            - lecture_id: ID лекции.
+            - width: ширина, под которую клиент показывает фото (None — самый большой вариант).
+            - accept_webp: клиент принимает WebP.
+            - session: сессия запроса (None — метод открывает свою, только на чтение).
+
+        Возвращает:
+            Путь к самому маленькому варианту, который не уже width, исходное фото,
+            если производные ещё не готовы, или None, если фото у лекции нет.
+        '''
+        async with use_session(session, read_only=True) as session:
+            query = select(Lectures.offline_photo, Lectures.offline_photo_variants).where(Lectures.id == lecture_id)
+            result = await session.execute(query)
+            row = result.one_or_none()
+
+        if row is None or not row.offline_photo:
+            return None
+
+        variant = select_variant(row.offline_photo_variants, width, accept_webp)
+        return variant["path"] if variant else row.offline_photo
+
+
+    @staticmethod
+    @observe_dao
+    async def reconcile_registered_counts(repair: bool = True, session: Optional[AsyncSession] = None) -> list[dict]:
+        f'''
+        Сверка счётчика registered_count с фактическим числом регистраций.
+
+        Аргументы:
+            - repair: исправить найденные расхождения.
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            Список расхождений: id лекции, значение счётчика и фактическое число регистраций.
+        '''
+        async with use_session(session) as session:
+            actual = (
+                select(LectureRegistrations.lecture_id, func.count().label("total"))
+                .group_by(LectureRegistrations.lecture_id)
+                .subquery()
+            )
+            actual_count = func.coalesce(actual.c.total, 0)
+            drift_query = (
+                select(Lectures.id, Lectures.registered_count, actual_count.label("actual"))
+                .outerjoin(actual, Lectures.id == actual.c.lecture_id)
+                .where(Lectures.registered_count != actual_count)
+            )
+            drift_result = await session.execute(drift_query)
+            drift = [
+                {"id": row.id, "registered_count": row.registered_count, "actual": row.actual}
+                for row in drift_result.all()
+            ]
+
+            if drift and repair:
+                drifted_ids = [row["id"] for row in drift]
+                # Сначала блокируем лекции, чтобы пересчёт видел все зафиксированные регистрации
+                await session.execute(select(Lectures.id).where(Lectures.id.in_(drifted_ids)).with_for_update())
+                recount = (
+                    select(func.count())
+                    .select_from(LectureRegistrations)
+                    .where(LectureRegistrations.lecture_id == Lectures.id)
+                    .scalar_subquery()
+                )
+                await session.execute(
+                    update(Lectures)
+                    .where(Lectures.id.in_(drifted_ids))
+                    .values(registered_count=recount)
+                    .execution_options(synchronize_session=False)
+                )
+                on_commit(session, lambda: seat_feed.publish(*drifted_ids))
+
+            return drift
+
+
+    @staticmethod
+    @observe_dao
+    async def reconcile_category_counts(repair: bool = True, session: Optional[AsyncSession] = None) -> list[dict]:
+        f'''
+        Сверка счётчика registered_peoples направлений с фактическим числом участников команд.
+
+        Аргументы:
+            - repair: исправить найденные расхождения.
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            Список расхождений: id направления, значение счётчика и фактическое число участников.
+        '''
+        async with use_session(session) as session:
+            actual = (
+                select(RegCommand.category_id, func.count(Member.id).label("total"))
+                .join(Member, Member.command_id == RegCommand.id)
+                .group_by(RegCommand.category_id)
+                .subquery()
+            )
+            actual_count = func.coalesce(actual.c.total, 0)
+            drift_query = (
+                select(Category.id, Category.registered_peoples, actual_count.label("actual"))
+                .outerjoin(actual, Category.id == actual.c.category_id)
+                .where(Category.registered_peoples != actual_count)
+            )
+            drift_result = await session.execute(drift_query)
+            drift = [
+                {"id": row.id, "registered_peoples": row.registered_peoples, "actual": row.actual}
+                for row in drift_result.all()
+            ]
+
+            if drift and repair:
+                drifted_ids = [row["id"] for row in drift]
+                # Сначала блокируем направления, чтобы пересчёт видел все зафиксированные команды
+                await session.execute(select(Category.id).where(Category.id.in_(drifted_ids)).with_for_update())
+                recount = (
+                    select(func.count(Member.id))
+                    .join(RegCommand, RegCommand.id == Member.command_id)
+                    .where(RegCommand.category_id == Category.id)
+                    .scalar_subquery()
+                )
+                await session.execute(
+                    update(Category)
+                    .where(Category.id.in_(drifted_ids))
+                    .values(registered_peoples=recount)
+                    .execution_options(synchronize_session=False)
+                )
+
+            return drift
+
+
+    @staticmethod
+    @observe_dao
+    async def stream_registrations(lecture_id: Optional[int] = None,
+                                   batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Sequence]]:
+        f'''
+        Регистрации на лекции с данными пользователя и лекции для выгрузки, пачками по batch_size строк.
+
+        Строки читаются серверным курсором (stream + yield_per), поэтому в памяти одновременно
+        только одна пачка. Генератор дочитывают уже после ответа на запрос, когда сессия запроса
+        закрыта, поэтому метод всегда открывает свою транзакцию только на чтение.
+
+        Аргументы:
+            - lecture_id: ID лекции (None — все лекции).
+            - batch_size: строк в пачке.
+
+        Возвращает:
+            Асинхронный итератор пачек строк в порядке services.exports.REGISTRATION_COLUMNS.
+        '''
+        query = (
+            select(LectureRegistrations.id, Lectures.id, Lectures.title, Lectures.date, Users.id,
+                   Users.user_name, Users.user_tg, Users.username_tg, LectureRegistrations.checked_in_at)
+            .join(Lectures, Lectures.id == LectureRegistrations.lecture_id)
+            .join(Users, Users.id == LectureRegistrations.user_id)
+            .order_by(LectureRegistrations.lecture_id, LectureRegistrations.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if lecture_id is not None:
+            query = query.where(LectureRegistrations.lecture_id == lecture_id)
+
+        async with use_session(read_only=True) as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+
+    @staticmethod
+    @observe_dao
+    async def stream_teams(category_id: Optional[int] = None,
+                           batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Sequence]]:
+        f'''
+        Команды с направлением и участниками для выгрузки, пачками по batch_size строк
+        (по строке на участника; команда без участников — одна строка с пустыми полями участника).
+        Читается серверным курсором в своей транзакции, как stream_registrations.
+
+        Аргументы:
+            - category_id: ID направления (None — все направления).
+            - batch_size: строк в пачке.
+
+        Возвращает:
+            Асинхронный итератор пачек строк в порядке services.exports.TEAM_COLUMNS.
+        '''
+        query = (
+            select(RegCommand.id, RegCommand.command_name, Category.name_category, Member.id,
+                   Member.first_name, Member.last_name, Member.telegram)
+            .join(Category, Category.id == RegCommand.category_id)
+            .outerjoin(Member, Member.command_id == RegCommand.id)
+            .order_by(RegCommand.id, Member.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if category_id is not None:
+            query = query.where(RegCommand.category_id == category_id)
+
+        async with use_session(read_only=True) as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+
+    @staticmethod
+    @observe_dao
+    async def add_score(user_id: int, delta: float, session: Optional[AsyncSession] = None) -> Optional[float]:
+        f'''
+        Начисление (или списание при отрицательном delta) баллов пользователю атомарным UPDATE.
+        Рейтинг в памяти обновляется после фиксации транзакции.
+
+        Аргументы:
+            - user_id: ID пользователя.
+            - delta: изменение баллов.
+            - session: сессия запроса (None — метод открывает свою).
+
+        Возвращает:
+            Новые баллы пользователя или None, если пользователь не найден.
+        '''
+        query = (
+            update(Users)
+            .where(Users.id == user_id)
+            .values(score=Users.score + delta)
+            .returning(Users.score, Users.user_name)
+            .execution_options(synchronize_session=False)
+        )
+        async with use_session(session) as session:
+            result = await session.execute(query)
+            row = result.one_or_none()
+            if row is None:
+                return None
+            on_commit(session, lambda: leaderboard.update(user_id, row.score, row.user_name))
+
+        return row.score
+
+
+    @staticmethod
+    @observe_dao
+    async def stream_scores(batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Sequence]]:
+        f'''
+        Баллы всех пользователей для перестройки рейтинга, пачками по batch_size строк
+        через серверный курсор в своей транзакции только на чтение.
+
+        Аргументы:
+            - batch_size: строк в пачке.
+
+        Возвращает:
+            Асинхронный итератор пачек строк (id, user_name, score).
+        '''
+        query = select(Users.id, Users.user_name, Users.score).execution_options(yield_per=batch_size)
+        async with use_session(read_only=True) as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+
+    @staticmethod
+    @observe_dao
+    async def find_user_by_tg_id(username_tg: str, session: Optional[AsyncSession] = None) -> Optional[UserIdentity]:
         f'''
         Метод для поиска пользователя по tg_id.
 
         Аргументы:
             - tg_id: Telegram ID пользователя (строка)
+            - session: сессия запроса (None — метод открывает свою)
 
         Возвращает:
-            Объект Users или None, если пользователь не найден.
+            Снимок пользователя UserIdentity или None, если пользователь не найден.
         '''
-        async with async_session_maker() as session:
+        async with use_session(session, read_only=True) as session:
             query = select(Users).filter_by(username_tg=username_tg)
             result = await session.execute(query)
             user = result.scalar_one_or_none()
-            return user
+            return UserIdentity.from_user(user) if user is not None else None
 
 
     @staticmethod
-    async def find_category_by_name(category_name: str) -> Optional[Category]:
+    @observe_dao
+    async def find_category_by_name(category_name: str, session: Optional[AsyncSession] = None) -> Optional[Category]:
         f'''
         Метод для поиска категории по имени.
 
         Аргументы:
             - category_name: Название категории (например, "Дизайн")
+            - session: сессия запроса (None — метод открывает свою)
 
         Возвращает:
             Объект Category или None, если категория не найдена.
         '''
-        async with async_session_maker() as session:
+        async with use_session(session, read_only=True) as session:
             query = select(Category).filter_by(name_category=category_name)
             result = await session.execute(query)
             category = result.scalar_one_or_none()
@@ -368,52 +987,105 @@ class BaseDAO:
 
 
     @staticmethod
-    async def create_team(
-        team_name: str,
-        category_id: int,
-        participants: list[dict],
-        tg_id: str
-    ) -> RegCommand:
+    @observe_dao
+    async def create_team(team_name: str, category_id: int, participants: list[dict],
+                          session: Optional[AsyncSession] = None) -> TeamRegistrationResult:
         f'''
------------------------ СКОРЕЕ ВСЕГО НЕ ПРИГОДИТСЯ -------------------------------------------------------------------
+        Регистрация команды с участниками на направление в одной транзакции.
 
-        Метод для создания команды и связанных участников.
+        Строка направления блокируется (SELECT ... FOR UPDATE) вместе с чтением счётчика
+        registered_peoples, поэтому одновременные регистрации на одно направление идут по очереди
+        и не превышают max_peoples. Под этой блокировкой одним запросом ищутся участники,
+        уже состоящие в командах направления, затем команда, все участники и увеличение счётчика
+        записываются одним запросом. Успешная регистрация — три запроса к БД.
+        Порядок проверок: направление, повторные участники, свободные места.
 
         Аргументы:
             - team_name: Название команды
             - category_id: ID категории (направления)
             - participants: Список участников (каждый участник — словарь с полями telegram, first_name, last_name)
-            - tg_id: Telegram ID пользователя, который регистрирует команду
+            - session: сессия запроса (None — метод открывает свою)
 
         Возвращает:
-            Созданный объект RegCommand.
+            TeamRegistrationResult со статусом registered / full / duplicate_member / category_not_found.
 
         Выбрасывает:
-            SQLAlchemyError, если произошла ошибка при сохранении.
+            ValueError, если участников нет.
         '''
-        async with async_session_maker() as session:
-            try:
-                # Создаем команду
-                new_team = RegCommand(
-                    command_name=team_name,
-                    category_id=category_id
+        if not participants:
+            raise ValueError("В команде должен быть хотя бы один участник")
+
+        telegrams = [participant["telegram"] for participant in participants]
+        repeated = sorted({telegram for telegram in telegrams if telegrams.count(telegram) > 1})
+        if repeated:
+            return TeamRegistrationResult(TeamRegistrationStatus.DUPLICATE_MEMBER, duplicates=tuple(repeated))
+
+        places = len(participants)
+        async with use_session(session) as session:
+            lock_query = (
+                select(Category.max_peoples, Category.registered_peoples)
+                .where(Category.id == category_id)
+                .with_for_update()
+            )
+            lock_result = await session.execute(lock_query)
+            category = lock_result.one_or_none()
+
+            if category is None:
+                return TeamRegistrationResult(TeamRegistrationStatus.CATEGORY_NOT_FOUND)
+
+            remaining_places = max(category.max_peoples - category.registered_peoples, 0)
+
+            # Отдельный запрос после блокировки: его снимок видит команды, зафиксированные, пока мы ждали
+            duplicates_query = (
+                select(Member.telegram)
+                .join(RegCommand, RegCommand.id == Member.command_id)
+                .where(RegCommand.category_id == category_id, Member.telegram.in_(telegrams))
+                .distinct()
+            )
+            duplicates_result = await session.execute(duplicates_query)
+            duplicates = sorted(duplicates_result.scalars().all())
+
+            # Участник, уже состоящий в команде, получает DUPLICATE_MEMBER и на заполненном направлении
+            if duplicates:
+                return TeamRegistrationResult(TeamRegistrationStatus.DUPLICATE_MEMBER,
+                                              remaining_places=remaining_places,
+                                              duplicates=tuple(duplicates))
+
+            if places > remaining_places:
+                return TeamRegistrationResult(TeamRegistrationStatus.FULL, remaining_places=remaining_places)
+
+            reserved = (
+                update(Category)
+                .where(Category.id == category_id)
+                .values(registered_peoples=Category.registered_peoples + places)
+                .returning(Category.id)
+                .cte("reserved")
+            )
+            team = (
+                pg_insert(RegCommand)
+                .values(command_name=team_name, category_id=category_id)
+                .returning(RegCommand.id)
+                .cte("team")
+            )
+            members = values(
+                column("first_name", String), column("last_name", String), column("telegram", String),
+                name="new_members",
+            ).data([(participant["first_name"], participant["last_name"], participant["telegram"])
+                    for participant in participants])
+            members_query = (
+                pg_insert(Member)
+                .from_select(
+                    ["first_name", "last_name", "telegram", "command_id"],
+                    select(members.c.first_name, members.c.last_name, members.c.telegram, team.c.id)
+                    .select_from(members)
+                    .join(team, true()),
                 )
-                session.add(new_team)
-                await session.commit()
-                await session.refresh(new_team)
-
-                # Создаем участников
-                for participant in participants:
-                    new_member = Member(
-                        first_name=participant["first_name"],
-                        last_name=participant["last_name"],
-                        telegram=participant["telegram"],
-                        command_id=new_team.id
-                    )
-                    session.add(new_member)
-
-                await session.commit()
-                return new_team
-            except SQLAlchemyError as e:
-                await session.rollback()
-                raise e
\ No newline at end of file
+                .returning(Member.command_id)
+                .add_cte(team)
+                .add_cte(reserved)
+            )
+            members_result = await session.execute(members_query)
+            team_id = members_result.scalars().first()
+
+        return TeamRegistrationResult(TeamRegistrationStatus.REGISTERED, team_id=team_id,
+                                      remaining_places=remaining_places - places)
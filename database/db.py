@@ -1,14 +1,102 @@
 import os
+import time
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
 
-from dotenv import load_dotenv, find_dotenv 
+from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
+from database.profiling import install_query_hooks
 
-engine = create_async_engine(url=os.getenv('DATABASE_URL'))
+
+# Параметры пула соединений на один воркер uvicorn.
+# Суммарно (DB_POOL_SIZE + DB_MAX_OVERFLOW) * число воркеров должно укладываться в max_connections Postgres.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Кэш подготовленных выражений asyncpg на соединение; 0 — для pgbouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    '''
+    Пул соединений, который замеряет время выдачи соединения (checkout) и считает таймауты
+    и открытые соединения — по ним видно насыщение пула.
+
+    Время выдачи — весь вызов Pool.connect(): ожидание свободного соединения в очереди,
+    открытие нового соединения сверх pool_size и pre-ping. Рост opened при росте checkout
+    означает открытие соединений, рост timeouts — исчерпание пула.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.opened = 0
+        self.checkout_total = 0.0
+        self.checkout_max = 0.0
+        self._recent_checkouts = deque(maxlen=1000)
+        event.listen(self, "connect", self._on_connect)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self.opened += 1
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.checkouts += 1
+            self.checkout_total += elapsed
+            self.checkout_max = max(self.checkout_max, elapsed)
+            self._recent_checkouts.append(elapsed)
+
+    def stats(self) -> dict:
+        recent = sorted(self._recent_checkouts)
+        percentile = lambda q: recent[min(int(len(recent) * q), len(recent) - 1)] * 1000 if recent else 0.0
+        return {
+            "pid": os.getpid(),
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "opened": self.opened,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "checkout_avg_ms": self.checkout_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            "checkout_max_ms": self.checkout_max * 1000,
+            "checkout_p50_ms": percentile(0.50),
+            "checkout_p99_ms": percentile(0.99),
+        }
+
+
+engine = create_async_engine(url=os.getenv('DATABASE_URL'),
+                             poolclass=InstrumentedPool,
+                             pool_size=DB_POOL_SIZE,
+                             max_overflow=DB_MAX_OVERFLOW,
+                             pool_timeout=DB_POOL_TIMEOUT,
+                             pool_recycle=DB_POOL_RECYCLE,
+                             pool_pre_ping=DB_POOL_PRE_PING,
+                             connect_args={
+                                 "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+                                 "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+                             },
+                             )
+# Замер каждого выражения: лог медленных запросов (SLOW_QUERY_MS) и счётчики на HTTP-запрос
+install_query_hooks(engine.sync_engine)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
-    __abstact__ = True
\ No newline at end of file
+    __abstact__ = True
@@ -0,0 +1,57 @@
+import asyncio
+import logging
+import os
+import time
+
+from database.dao import BaseDAO
+from database.leaderboard import LEADERBOARD_REFRESH_INTERVAL, leaderboard
+
+logger = logging.getLogger(__name__)
+
+# Период сверки счётчиков мест в секундах, 0 — сверка отключена
+SEATS_RECONCILE_INTERVAL = int(os.getenv("SEATS_RECONCILE_INTERVAL", "300"))
+
+
+async def reconcile_seats_periodically(interval: int = SEATS_RECONCILE_INTERVAL):
+    '''
+    Фоновая задача: периодически сверяет registered_count лекций с lecture_registrations
+    и registered_peoples направлений с участниками команд, исправляя расхождения.
+    '''
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            drift = await BaseDAO.reconcile_registered_counts(repair=True)
+            category_drift = await BaseDAO.reconcile_category_counts(repair=True)
+        except Exception:
+            logger.exception('Ошибка сверки счётчиков мест')
+            continue
+
+        for row in drift:
+            logger.warning(f'Исправлен счётчик мест лекции {row["id"]}: {row["registered_count"]} -> {row["actual"]}')
+        for row in category_drift:
+            logger.warning(f'Исправлен счётчик мест направления {row["id"]}: {row["registered_peoples"]} -> {row["actual"]}')
+
+
+async def refresh_leaderboard():
+    '''Перестраивает рейтинг из БД; изменения баллов во время чтения не теряются.'''
+    started = time.perf_counter()
+    leaderboard.begin_rebuild()
+    try:
+        rows = []
+        async for batch in BaseDAO.stream_scores():
+            rows.extend(batch)
+    except BaseException:
+        leaderboard.cancel_rebuild()
+        raise
+    leaderboard.finish_rebuild(rows, started)
+    logger.info(f'Рейтинг перестроен: {len(leaderboard)} пользователей за {leaderboard.rebuild_seconds:.2f} с')
+
+
+async def refresh_leaderboard_periodically(interval: int = LEADERBOARD_REFRESH_INTERVAL):
+    '''Фоновая задача: периодически перестраивает рейтинг, подхватывая баллы, изменённые другими воркерами.'''
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await refresh_leaderboard()
+        except Exception:
+            logger.exception('Ошибка перестройки рейтинга')
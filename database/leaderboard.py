@@ -0,0 +1,136 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sortedcontainers import SortedList
+
+# Период полной перестройки рейтинга из БД в секундах, 0 — только при старте.
+# Изменения баллов в этом воркере применяются сразу, из других воркеров — при перестройке
+LEADERBOARD_REFRESH_INTERVAL = int(os.getenv("LEADERBOARD_REFRESH_INTERVAL", "60"))
+LEADERBOARD_TOP_SIZE = int(os.getenv("LEADERBOARD_TOP_SIZE", "10"))
+LEADERBOARD_MAX_TOP_SIZE = int(os.getenv("LEADERBOARD_MAX_TOP_SIZE", "100"))
+LEADERBOARD_NEIGHBORS = int(os.getenv("LEADERBOARD_NEIGHBORS", "2"))
+
+
+@dataclass(frozen=True)
+class LeaderboardEntry:
+    rank: int
+    user_id: int
+    user_name: str
+    score: float
+
+
+class Leaderboard:
+    '''
+    Рейтинг пользователей по Users.score в памяти процесса.
+
+    Пользователи хранятся в SortedList по ключу (-score, user_id), поэтому место пользователя,
+    топ-N и соседи по рейтингу находятся бинарным поиском за O(log n), без сортировки всех
+    пользователей на каждый запрос. Изменение баллов — удаление и вставка ключа, O(log n).
+    Пользователи с равными баллами делят место (1, 2, 2, 4).
+
+    Обновления приходят из обработчиков on_commit, а перестройка читает снимок из БД, отдавая
+    управление циклу событий. Поэтому обновления, пришедшие во время чтения снимка, копятся
+    в _pending и применяются поверх него в finish_rebuild, а сама замена структур происходит
+    без await и не видна запросам наполовину.
+    '''
+
+    def __init__(self):
+        self._order: SortedList = SortedList()
+        self._scores: dict[int, float] = {}
+        self._names: dict[int, str] = {}
+        # Изменения, пришедшие во время перестройки: их нет в читаемом из БД снимке
+        self._pending: Optional[dict[int, tuple[float, Optional[str]]]] = None
+        self.loaded = False
+        self.rebuilt_at: Optional[float] = None
+        self.rebuild_seconds = 0.0
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _set(self, scores: dict[int, float], order: SortedList, names: dict[int, str],
+             user_id: int, score: float, user_name: Optional[str]):
+        previous = scores.get(user_id)
+        if previous is not None:
+            order.remove((-previous, user_id))
+        scores[user_id] = score
+        order.add((-score, user_id))
+        if user_name is not None:
+            names[user_id] = user_name
+
+    def update(self, user_id: int, score: float, user_name: Optional[str] = None):
+        '''Новые баллы пользователя (и имя, если передано). Вызывается после фиксации транзакции.'''
+        self._set(self._scores, self._order, self._names, user_id, score, user_name)
+        if self._pending is not None:
+            self._pending[user_id] = (score, user_name)
+        self.updates += 1
+
+    def begin_rebuild(self):
+        '''Начало чтения снимка из БД: изменения с этого момента будут применены поверх снимка.'''
+        self._pending = {}
+
+    def finish_rebuild(self, rows: Iterable[tuple[int, str, float]], started: float):
+        '''
+        Заменяет рейтинг снимком из БД (id, user_name, score) и применяет изменения,
+        пришедшие во время чтения снимка.
+        '''
+        pending, self._pending = self._pending or {}, None
+        scores = {}
+        names = {}
+        for user_id, user_name, score in rows:
+            scores[user_id] = score
+            names[user_id] = user_name
+        order = SortedList((-score, user_id) for user_id, score in scores.items())
+        for user_id, (score, user_name) in pending.items():
+            self._set(scores, order, names, user_id, score, user_name)
+
+        self._order, self._scores, self._names = order, scores, names
+        self.loaded = True
+        self.rebuilt_at = time.time()
+        self.rebuild_seconds = time.perf_counter() - started
+
+    def cancel_rebuild(self):
+        self._pending = None
+
+    def _rank(self, score: float) -> int:
+        # Место = 1 + число пользователей со строго большими баллами; id пользователей положительные
+        return self._order.bisect_left((-score, 0)) + 1
+
+    def _entry(self, key: tuple[float, int]) -> LeaderboardEntry:
+        score, user_id = -key[0], key[1]
+        return LeaderboardEntry(rank=self._rank(score), user_id=user_id,
+                                user_name=self._names.get(user_id, ""), score=score)
+
+    def top(self, limit: int = LEADERBOARD_TOP_SIZE) -> list[LeaderboardEntry]:
+        return [self._entry(key) for key in self._order.islice(0, limit)]
+
+    def around(self, user_id: int, neighbors: int = LEADERBOARD_NEIGHBORS
+               ) -> Optional[tuple[LeaderboardEntry, list[LeaderboardEntry]]]:
+        '''
+        Место пользователя и по neighbors соседей выше и ниже него.
+
+        Возвращает:
+            (запись пользователя, записи соседей и самого пользователя по порядку) или None,
+            если пользователя нет в рейтинге.
+        '''
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        key = (-score, user_id)
+        position = self._order.index(key)
+        window = [self._entry(item) for item in self._order.islice(max(position - neighbors, 0), position + neighbors + 1)]
+        return self._entry(key), window
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "users": len(self._scores),
+            "updates": self.updates,
+            "rebuilt_at": self.rebuilt_at,
+            "rebuild_seconds": self.rebuild_seconds,
+        }
+
+
+leaderboard = Leaderboard()
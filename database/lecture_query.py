@@ -0,0 +1,112 @@
+import base64
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from database.timeutil import naive_utc
+
+# Размер страницы списка лекций по умолчанию и максимальный
+LECTURES_PAGE_SIZE = int(os.getenv("LECTURES_PAGE_SIZE", "50"))
+LECTURES_MAX_PAGE_SIZE = int(os.getenv("LECTURES_MAX_PAGE_SIZE", "200"))
+# Лекция не длится дольше этого срока: идущие сейчас лекции ищутся по индексу (date, id) в этом окне
+LECTURE_MAX_DURATION_HOURS = int(os.getenv("LECTURE_MAX_DURATION_HOURS", "24"))
+
+LECTURE_FIELDS = (
+    "id", "title", "speaker", "date", "end_time", "max_seats", "remaining_seats",
+    "format", "conference_link", "offline_map_link", "offline_photo",
+)
+
+# Наборы полей: list — карточки списка без ссылок и фото, full — всё
+FIELD_PRESETS = {
+    "full": LECTURE_FIELDS,
+    "list": ("id", "title", "speaker", "date", "end_time", "remaining_seats", "format"),
+}
+
+
+class InvalidLectureQuery(ValueError):
+    '''Некорректные параметры списка лекций (поля, курсор, размер страницы).'''
+
+
+def parse_fields(fields: Optional[str]) -> tuple[str, ...]:
+    '''
+    Разбирает параметр fields: имя набора (full, list) или поля через запятую.
+    Порядок полей в ответе всегда как в LECTURE_FIELDS.
+
+    Выбрасывает:
+        InvalidLectureQuery, если указано неизвестное поле.
+    '''
+    if not fields:
+        return LECTURE_FIELDS
+    if fields in FIELD_PRESETS:
+        return FIELD_PRESETS[fields]
+
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(LECTURE_FIELDS)
+    if unknown:
+        raise InvalidLectureQuery(f"Неизвестные поля: {', '.join(sorted(unknown))}")
+    return tuple(field for field in LECTURE_FIELDS if field in requested)
+
+
+def encode_cursor(date: datetime, lecture_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{lecture_id}".encode()).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    '''
+    Выбрасывает:
+        InvalidLectureQuery, если курсор повреждён.
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, lecture_id = raw.split("|")
+        # Курсор приходит от клиента: время с поясом приводится к наивному UTC, как колонка date
+        return naive_utc(datetime.fromisoformat(date)), int(lecture_id)
+    except (ValueError, UnicodeError):
+        raise InvalidLectureQuery("Некорректный курсор")
+
+
+@dataclass(frozen=True)
+class LectureQuery:
+    '''
+    Параметры страницы списка лекций. Неизменяемый и хешируемый — служит ключом кэша.
+
+    Поля:
+        - date_from, date_to: границы начала лекции
+        - format: online / offline
+        - has_seats: только лекции со свободными местами
+        - include_past: показывать прошедшие лекции (по умолчанию только идущие и будущие)
+        - after: курсор (date, id) последней лекции предыдущей страницы
+        - limit: размер страницы
+        - fields: поля в ответе
+    '''
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    format: Optional[str] = None
+    has_seats: bool = False
+    include_past: bool = False
+    after: Optional[tuple[datetime, int]] = None
+    limit: int = LECTURES_PAGE_SIZE
+    fields: tuple[str, ...] = LECTURE_FIELDS
+
+    @classmethod
+    def from_params(cls, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                    format: Optional[str] = None, has_seats: bool = False, include_past: bool = False,
+                    cursor: Optional[str] = None, limit: int = LECTURES_PAGE_SIZE,
+                    fields: Optional[str] = None) -> "LectureQuery":
+        '''
+        Собирает запрос из параметров HTTP.
+
+        Выбрасывает:
+            InvalidLectureQuery при неизвестных полях, повреждённом курсоре или размере страницы вне пределов.
+        '''
+        if not 1 <= limit <= LECTURES_MAX_PAGE_SIZE:
+            raise InvalidLectureQuery(f"limit должен быть от 1 до {LECTURES_MAX_PAGE_SIZE}")
+        return cls(date_from=naive_utc(date_from),
+                   date_to=naive_utc(date_to),
+                   format=format,
+                   has_seats=has_seats,
+                   include_past=include_past,
+                   after=decode_cursor(cursor) if cursor else None,
+                   limit=limit,
+                   fields=parse_fields(fields))
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Double
+from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Double, UniqueConstraint, Index, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from database.db import Base
 from datetime import datetime 
@@ -10,6 +10,7 @@ class Category(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name_category: Mapped[str] = mapped_column(String(50))
     max_peoples: Mapped[int] = mapped_column(Integer)
+    registered_peoples: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # участники команд направления, поддерживается DAO
     commands: Mapped[list["RegCommand"]] = relationship(back_populates="category")
 
     def __repr__(self):
@@ -37,7 +38,7 @@ class Users(Base):
     user_tg: Mapped[str] = mapped_column(String, unique=True) # ID в телеграм 
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
     score: Mapped[float] = mapped_column(Double, default=0.0)
-    username_tg: Mapped[str] = mapped_column(String) # username в телеграм
+    username_tg: Mapped[str] = mapped_column(String, index=True) # username в телеграм
 
     registrations: Mapped[list["LectureRegistrations"]] = relationship(back_populates="user")
 
@@ -51,7 +52,7 @@ class Member(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     first_name: Mapped[str] = mapped_column(String, nullable=False)
     last_name: Mapped[str] = mapped_column(String, nullable=False)
-    telegram: Mapped[str] = mapped_column(String, nullable=False)
+    telegram: Mapped[str] = mapped_column(String, nullable=False, index=True)
     command_id: Mapped[int] = mapped_column(ForeignKey("reg_commands.id"))
     command: Mapped["RegCommand"] = relationship(back_populates="members")
 
@@ -61,6 +62,10 @@ class Member(Base):
 
 class Lectures(Base):
     __tablename__ = 'lectures'
+    __table_args__ = (
+        # Ключ постраничной выдачи списка лекций (keyset по (date, id))
+        Index("ix_lectures_date_id", "date", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -72,19 +77,29 @@ class Lectures(Base):
     conference_link: Mapped[str] = mapped_column(String(255), nullable=True)
     offline_map_link: Mapped[str] = mapped_column(String(255), nullable=True)
     offline_photo: Mapped[str] = mapped_column(String(255), nullable=True)
+    offline_photo_variants: Mapped[list] = mapped_column(JSON, nullable=True)  # уменьшенные копии offline_photo: width, height, format, path
+    registered_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # поддерживается DAO при записи/отписке
 
     registrations: Mapped[list["LectureRegistrations"]] = relationship(back_populates="lecture")
 
+    @property
+    def remaining_seats(self) -> int:
+        return self.max_seats - self.registered_count
+
     def __repr__(self):
         return f"<Lectures(id={self.id}, title='{self.title}', speaker='{self.speaker}', date={self.date}, format={self.format})>"
 
 
 class LectureRegistrations(Base):
     __tablename__ = 'lecture_registrations'
+    __table_args__ = (
+        UniqueConstraint("user_id", "lecture_id", name="uq_lecture_registrations_user_id_lecture_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
-    lecture_id: Mapped[int] = mapped_column(ForeignKey("lectures.id"), nullable=False)
+    lecture_id: Mapped[int] = mapped_column(ForeignKey("lectures.id"), nullable=False, index=True)
+    checked_in_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)  # время прохода по QR-билету
 
     user: Mapped["Users"] = relationship(back_populates="registrations")
     lecture: Mapped["Lectures"] = relationship(back_populates="registrations")
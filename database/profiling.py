@@ -0,0 +1,155 @@
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Порог медленного запроса в миллисекундах, 0 — логировать все запросы
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Добавлять ли к ответам заголовки X-DB-Queries / X-DB-Time-Ms (для отладки и нагрузочных тестов)
+DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "false").lower() in ("1", "true", "yes")
+
+# Метод BaseDAO, который сейчас выполняется в этой задаче (проставляет services.metrics.observe_dao)
+current_dao_method: ContextVar[Optional[str]] = ContextVar("current_dao_method", default=None)
+
+
+class QueryStats:
+    '''
+    Счётчик SQL-запросов и времени в БД для запроса или блока кода.
+    Учитываются выполненные выражения; BEGIN/COMMIT драйвера не считаются.
+    '''
+
+    __slots__ = ("count", "seconds", "parent")
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.count = 0
+        self.seconds = 0.0
+        self.parent = parent
+
+    def record(self, seconds: float):
+        stats = self
+        # Вложенные счётчики (assert_max_queries внутри запроса) пополняют и внешние
+        while stats is not None:
+            stats.count += 1
+            stats.seconds += seconds
+            stats = stats.parent
+
+    @property
+    def milliseconds(self) -> float:
+        return self.seconds * 1000
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"\$\d+(?:::[A-Za-z_\[\]]+)?")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+_TUPLES_RE = re.compile(r"\(\?, \.\.\.\)(?:\s*,\s*\(\?, \.\.\.\))+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str, limit: int = 1000) -> str:
+    '''
+    Приводит SQL к шаблону для логов: параметры и литералы заменяются на ?,
+    списки IN любой длины сворачиваются в "?, ...", пробелы схлопываются.
+    '''
+    sql = _STRING_RE.sub("?", statement)
+    sql = _PARAM_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _LIST_RE.sub("?, ...", sql)
+    sql = _TUPLES_RE.sub("(?, ...), ...", sql)
+    sql = _SPACE_RE.sub(" ", sql).strip()
+    return sql if len(sql) <= limit else sql[:limit] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(elapsed)
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f'Медленный запрос {elapsed * 1000:.1f} мс в {current_dao_method.get() or "-"}: '
+                       f'{normalize_sql(statement)}')
+
+
+def install_query_hooks(engine: Engine):
+    '''Подключает замер времени каждого выражения к синхронному движку (engine.sync_engine для async).'''
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    '''Считает запросы, выполненные внутри блока в текущей задаче (и во вложенных вызовах).'''
+    stats = QueryStats(parent=_query_stats.get())
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "") -> Iterator[QueryStats]:
+    '''
+    Проверка для регрессионных скриптов: блок должен выполнить не больше limit запросов.
+
+        with assert_max_queries(3, "register_for_lecture"):
+            await BaseDAO.register_for_lecture(lecture_id, user_id)
+
+    Выбрасывает:
+        AssertionError, если запросов больше limit.
+    '''
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f'{label or "Блок"}: {stats.count} запросов к БД при лимите {limit}')
+
+
+class QueryStatsMiddleware:
+    '''
+    ASGI-middleware: считает запросы к БД и время в БД за HTTP-запрос.
+    Итог пишется в debug-лог, а при DB_QUERY_HEADERS — в заголовки ответа.
+    Фиксация транзакции запроса происходит до отправки ответа, поэтому попадает в итог.
+    '''
+
+    def __init__(self, app: ASGIApp, headers: bool = DB_QUERY_HEADERS):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                logger.debug(f'{scope["method"]} {scope["path"]}: {stats.count} запросов, '
+                             f'{stats.milliseconds:.1f} мс в БД')
+                if self.headers:
+                    message.setdefault("headers", [])
+                    message["headers"] = [
+                        *message["headers"],
+                        (b"x-db-queries", str(stats.count).encode()),
+                        (b"x-db-time-ms", f"{stats.milliseconds:.1f}".encode()),
+                    ]
+            await send(message)
+
+        with track_queries() as stats:
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,142 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+from database.models import Users
+
+
+class RegistrationStatus(str, Enum):
+    REGISTERED = "registered"
+    FULL = "full"
+    DUPLICATE = "duplicate"
+    USER_NOT_FOUND = "user_not_found"
+    LECTURE_NOT_FOUND = "lecture_not_found"
+
+
+REGISTRATION_MESSAGES = {
+    RegistrationStatus.REGISTERED: "Вы успешно зарегистрированы на лекцию",
+    RegistrationStatus.FULL: "Места на лекцию закончились",
+    RegistrationStatus.DUPLICATE: "Вы уже зарегистрированы на эту лекцию",
+    RegistrationStatus.USER_NOT_FOUND: "Пользователь не найден",
+    RegistrationStatus.LECTURE_NOT_FOUND: "Лекция не найдена",
+}
+
+
+@dataclass(frozen=True)
+class RegistrationResult:
+    '''
+    Результат попытки регистрации на лекцию.
+
+    Поля:
+        - status: итог регистрации (RegistrationStatus)
+        - remaining_seats: сколько мест осталось после попытки (None, если лекция не найдена)
+    '''
+    status: RegistrationStatus
+    remaining_seats: Optional[int] = None
+
+    @property
+    def success(self) -> bool:
+        return self.status is RegistrationStatus.REGISTERED
+
+    @property
+    def message(self) -> str:
+        return REGISTRATION_MESSAGES[self.status]
+
+
+class QrStatus(str, Enum):
+    ISSUED = "issued"
+    NOT_REGISTERED = "not_registered"
+    NOT_YET_AVAILABLE = "not_yet_available"
+    EXPIRED = "expired"
+    LECTURE_NOT_FOUND = "lecture_not_found"
+
+
+QR_MESSAGES = {
+    QrStatus.ISSUED: "QR-код выдан",
+    QrStatus.NOT_REGISTERED: "Вы не зарегистрированы на эту лекцию",
+    QrStatus.NOT_YET_AVAILABLE: "QR-код будет доступен в день лекции",
+    QrStatus.EXPIRED: "Лекция уже закончилась",
+    QrStatus.LECTURE_NOT_FOUND: "Лекция не найдена",
+}
+
+
+@dataclass(frozen=True)
+class QrResult:
+    '''
+    Результат запроса QR-билета на лекцию.
+
+    Поля:
+        - status: итог запроса (QrStatus)
+        - token: подписанный билет (только для issued)
+        - image: картинка QR-кода в запрошенном формате (только для issued)
+        - media_type: MIME-тип картинки
+    '''
+    status: QrStatus
+    token: Optional[str] = None
+    image: Optional[bytes] = None
+    media_type: Optional[str] = None
+
+    @property
+    def message(self) -> str:
+        return QR_MESSAGES[self.status]
+
+
+class TeamRegistrationStatus(str, Enum):
+    REGISTERED = "registered"
+    FULL = "full"
+    DUPLICATE_MEMBER = "duplicate_member"
+    CATEGORY_NOT_FOUND = "category_not_found"
+
+
+TEAM_REGISTRATION_MESSAGES = {
+    TeamRegistrationStatus.REGISTERED: "Команда зарегистрирована",
+    TeamRegistrationStatus.FULL: "В направлении не хватает мест для всей команды",
+    TeamRegistrationStatus.DUPLICATE_MEMBER: "Участники уже состоят в команде этого направления",
+    TeamRegistrationStatus.CATEGORY_NOT_FOUND: "Направление не найдено",
+}
+
+
+@dataclass(frozen=True)
+class TeamRegistrationResult:
+    '''
+    Результат регистрации команды на направление.
+
+    Поля:
+        - status: итог регистрации (TeamRegistrationStatus)
+        - team_id: ID созданной команды (только для registered)
+        - remaining_places: сколько мест осталось в направлении (None, если направление не найдено)
+        - duplicates: telegram участников, уже состоящих в команде направления или указанных дважды
+    '''
+    status: TeamRegistrationStatus
+    team_id: Optional[int] = None
+    remaining_places: Optional[int] = None
+    duplicates: tuple[str, ...] = ()
+
+    @property
+    def success(self) -> bool:
+        return self.status is TeamRegistrationStatus.REGISTERED
+
+    @property
+    def message(self) -> str:
+        return TEAM_REGISTRATION_MESSAGES[self.status]
+
+
+@dataclass(frozen=True)
+class UserIdentity:
+    '''
+    Неизменяемый снимок пользователя. ORM-объекты Users привязаны к сессии,
+    поэтому из DAO наружу отдаётся только этот снимок.
+    '''
+    id: int
+    user_name: str
+    user_tg: str
+    username_tg: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: Users) -> "UserIdentity":
+        return cls(id=user.id,
+                   user_name=user.user_name,
+                   user_tg=user.user_tg,
+                   username_tg=user.username_tg,
+                   is_admin=user.is_admin)
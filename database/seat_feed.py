@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import asyncpg
+from pydantic import TypeAdapter
+
+from database.db import engine
+from schemas.lecture_schemas import SeatUpdate
+
+logger = logging.getLogger(__name__)
+
+# Окно накопления изменений мест в миллисекундах: за окно все изменения уходят одним запросом и одним событием
+SEAT_FEED_INTERVAL_MS = float(os.getenv("SEAT_FEED_INTERVAL_MS", "250"))
+# Сколько событий может накопить медленный подписчик, прежде чем его отключат с просьбой перечитать список
+SEAT_FEED_QUEUE_SIZE = int(os.getenv("SEAT_FEED_QUEUE_SIZE", "64"))
+# Период комментариев-пингов в потоке SSE, чтобы прокси не закрывали простаивающие соединения
+SEAT_FEED_HEARTBEAT = float(os.getenv("SEAT_FEED_HEARTBEAT", "15"))
+# Мост между воркерами через Postgres LISTEN/NOTIFY: нужен, если воркеров uvicorn больше одного
+SEAT_FEED_NOTIFY = os.getenv("SEAT_FEED_NOTIFY", "false").lower() in ("1", "true", "yes")
+SEAT_FEED_CHANNEL = os.getenv("SEAT_FEED_CHANNEL", "lecture_seats")
+
+# Предел размера payload NOTIFY в Postgres — 8000 байт
+_NOTIFY_PAYLOAD_LIMIT = 7900
+_updates_adapter = TypeAdapter(list[SeatUpdate])
+
+
+class Subscription:
+    '''Очередь готовых событий SSE одного подписчика. None в очереди — подписка закрыта из-за переполнения.'''
+
+    def __init__(self, maxsize: int = SEAT_FEED_QUEUE_SIZE):
+        self.queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue(maxsize=maxsize)
+
+
+class SeatFeed:
+    '''
+    Поток изменений свободных мест для подписчиков SSE.
+
+    Методы BaseDAO после фиксации транзакции вызывают publish(lecture_id). Изменения копятся
+    в течение interval_ms, затем одна задача читает актуальные места всех изменившихся лекций
+    одним запросом (loader), сериализует одно событие и раскладывает одни и те же байты
+    по очередям подписчиков. Стоимость изменения для БД не зависит от числа подписчиков.
+
+    С SEAT_FEED_NOTIFY изменения рассылаются остальным воркерам через NOTIFY на канал
+    SEAT_FEED_CHANNEL; каждый воркер сам читает места для своих подписчиков.
+    '''
+
+    def __init__(self, interval_ms: float = SEAT_FEED_INTERVAL_MS, notify: bool = SEAT_FEED_NOTIFY,
+                 channel: str = SEAT_FEED_CHANNEL):
+        self.interval_ms = interval_ms
+        self.notify = notify
+        self.channel = channel
+        self.batches = 0
+        self.events = 0
+        self.dropped = 0
+        self.remote_changes = 0
+        self._loader: Optional[Callable[[list[int]], Awaitable[list[SeatUpdate]]]] = None
+        self._subscribers: set[Subscription] = set()
+        self._changed: set[int] = set()
+        self._remote_changed: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._listener: Optional[asyncpg.Connection] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, loader: Callable[[list[int]], Awaitable[list[SeatUpdate]]]):
+        '''Запускает рассылку; loader читает места лекций по списку id (BaseDAO.get_seat_updates).'''
+        self._loader = loader
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        if self.notify:
+            self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks.clear()
+        for subscription in list(self._subscribers):
+            self._close(subscription)
+
+    def publish(self, *lecture_ids: int):
+        '''Отмечает лекции с изменившимися местами. Вызывается только после фиксации транзакции.'''
+        if not self.running:
+            return
+        self._changed.update(lecture_ids)
+        self._wakeup.set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def _close(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def _broadcast(self, event: bytes):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать: отключаем, при переподключении он перечитает список
+                self.dropped += 1
+                self._close(subscription)
+
+    async def _dispatch(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.interval_ms / 1000)
+            self._wakeup.clear()
+
+            changed, self._changed = self._changed, set()
+            remote_changed, self._remote_changed = self._remote_changed, set()
+            try:
+                if changed and self._listener is not None:
+                    await self._notify_others(changed)
+                lecture_ids = changed | remote_changed
+                # Без подписчиков в этом воркере читать места незачем
+                if lecture_ids and self._subscribers:
+                    await self._send(sorted(lecture_ids))
+            except Exception:
+                logger.exception('Ошибка рассылки изменений мест')
+
+    async def _send(self, lecture_ids: list[int]):
+        updates = {update.id: update for update in await self._loader(lecture_ids)}
+        # Удалённые лекции приходят без мест
+        payload = [updates.get(lecture_id, SeatUpdate(id=lecture_id)) for lecture_id in lecture_ids]
+        event = b"event: seats\ndata: " + _updates_adapter.dump_json(payload) + b"\n\n"
+        self.batches += 1
+        self.events += len(payload)
+        self._broadcast(event)
+
+    async def _notify_others(self, lecture_ids: set[int]):
+        payload = ""
+        for lecture_id in sorted(lecture_ids):
+            if len(payload) > _NOTIFY_PAYLOAD_LIMIT:
+                await self._listener.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                payload = ""
+            payload += f"{lecture_id},"
+        if payload:
+            await self._listener.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+
+    def _on_notification(self, connection, pid: int, channel: str, payload: str):
+        # Свои изменения воркер уже разослал
+        if pid == connection.get_server_pid():
+            return
+        lecture_ids = {int(lecture_id) for lecture_id in payload.split(",") if lecture_id}
+        self.remote_changes += len(lecture_ids)
+        self._remote_changed.update(lecture_ids)
+        self._wakeup.set()
+
+    async def _listen(self):
+        '''Держит отдельное от пула соединение с LISTEN и переподключается при его потере.'''
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            closed = asyncio.Event()
+            try:
+                self._listener = await asyncpg.connect(dsn)
+                self._listener.add_termination_listener(lambda connection: closed.set())
+                await self._listener.add_listener(self.channel, self._on_notification)
+                await closed.wait()
+                logger.warning('Соединение LISTEN потока мест закрыто, переподключение')
+            except asyncio.CancelledError:
+                if self._listener is not None:
+                    await self._listener.close()
+                raise
+            except Exception:
+                logger.exception('Не удалось подписаться на изменения мест через LISTEN')
+            self._listener = None
+            await asyncio.sleep(1)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "notify": self.notify,
+            "listening": self._listener is not None,
+            "interval_ms": self.interval_ms,
+            "subscribers": len(self._subscribers),
+            "batches": self.batches,
+            "events": self.events,
+            "dropped": self.dropped,
+            "remote_changes": self.remote_changes,
+        }
+
+
+seat_feed = SeatFeed()
+
+
+async def stream_events(subscription: Subscription, heartbeat: float = SEAT_FEED_HEARTBEAT) -> AsyncIterator[bytes]:
+    '''
+    Тело ответа text/event-stream для подписчика. Пинги держат соединение открытым,
+    при переполнении очереди клиент получает событие resync и соединение закрывается.
+    '''
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if event is None:
+                yield b"event: resync\ndata: {}\n\n"
+                return
+            yield event
+    finally:
+        seat_feed.unsubscribe(subscription)
@@ -0,0 +1,88 @@
+import inspect
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database.db import engine, async_session_maker
+
+logger = logging.getLogger(__name__)
+
+# Тот же пул соединений, но транзакции открываются как BEGIN READ ONLY (без лишнего запроса SET)
+read_only_session_maker = async_sessionmaker(engine.execution_options(postgresql_readonly=True),
+                                             class_=AsyncSession, expire_on_commit=False)
+
+_ON_COMMIT = "on_commit"
+_ON_ROLLBACK = "on_rollback"
+
+
+def on_commit(session: AsyncSession, callback: Callable):
+    '''
+    Откладывает побочный эффект (сброс кэша, удаление файла, фоновая задача) до фиксации
+    транзакции сессии. Если транзакция откатится, callback не вызывается.
+    callback может быть как обычной функцией, так и возвращать корутину.
+    '''
+    session.info.setdefault(_ON_COMMIT, []).append(callback)
+
+
+def on_rollback(session: AsyncSession, callback: Callable):
+    '''Регистрирует уборку на случай отката транзакции (например, удаление только что загруженного файла).'''
+    session.info.setdefault(_ON_ROLLBACK, []).append(callback)
+
+
+async def _run_callbacks(session: AsyncSession, key: str):
+    callbacks = session.info.pop(key, [])
+    session.info.pop(_ON_ROLLBACK if key == _ON_COMMIT else _ON_COMMIT, None)
+    for callback in callbacks:
+        try:
+            result = callback()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            # Транзакция уже завершена, ошибка побочного эффекта не должна менять ответ
+            logger.exception(f'Ошибка обработчика {key}')
+
+
+@asynccontextmanager
+async def session_scope(read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    '''
+    Сессия с одной транзакцией: фиксируется при выходе без исключения, иначе откатывается.
+    После фиксации выполняются обработчики on_commit, после отката — on_rollback.
+    Соединение берётся из пула только при первом запросе к БД.
+    '''
+    session_maker = read_only_session_maker if read_only else async_session_maker
+    async with session_maker() as session:
+        try:
+            async with session.begin():
+                yield session
+        except BaseException:
+            await _run_callbacks(session, _ON_ROLLBACK)
+            raise
+        await _run_callbacks(session, _ON_COMMIT)
+
+
+@asynccontextmanager
+async def use_session(session: Optional[AsyncSession] = None, read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    '''
+    Использует переданную сессию запроса как есть (фиксирует её владелец),
+    а без неё открывает собственную через session_scope.
+    '''
+    if session is not None:
+        yield session
+        return
+
+    async with session_scope(read_only) as own_session:
+        yield own_session
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    '''Зависимость FastAPI: одна сессия и одна транзакция на запрос, фиксация до отправки ответа.'''
+    async with session_scope() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    '''Зависимость FastAPI для GET-ручек: одна транзакция READ ONLY на запрос.'''
+    async with session_scope(read_only=True) as session:
+        yield session
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+# Колонки дат (DateTime без пояса) хранят время в UTC. Всё время, которое с ними сравнивается
+# или в них пишется, приводится к тому же виду — «наивному» UTC, независимо от пояса сервера.
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    '''Время с поясом приводится к UTC без пояса; время без пояса считается уже UTC.'''
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def utc_now() -> datetime:
+    '''Текущее время для сравнения с колонками дат.'''
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def utc_timestamp(value: datetime) -> int:
+    '''Unix time для значения колонки дат (наивного UTC).'''
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+
+def parse_utc(value: str) -> datetime:
+    '''Разбирает время ISO 8601 (суффикс Z допускается) в наивный UTC.'''
+    return naive_utc(datetime.fromisoformat(value.replace("Z", "+00:00")))
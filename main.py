@@ -1,11 +1,59 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers.user_router import user_router
 from routers.admin_router import admin_router
+from routers.media_router import media_router
+from database.db import engine
+from database.dao import BaseDAO
+from database.profiling import QueryStatsMiddleware
+from database.seat_feed import seat_feed
+from database.jobs import (SEATS_RECONCILE_INTERVAL, reconcile_seats_periodically,
+                           refresh_leaderboard, refresh_leaderboard_periodically)
+from database.leaderboard import LEADERBOARD_REFRESH_INTERVAL
+from services import images
+from services.storage import UploadLimitMiddleware, UploadRejected
+from services.metrics import MetricsMiddleware, mark_dead_workers, mark_worker_stopped, render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mark_dead_workers()
+    tasks = []
+    if SEATS_RECONCILE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(reconcile_seats_periodically()))
+    seat_feed.start(BaseDAO.get_seat_updates)
+
+    try:
+        await refresh_leaderboard()
+    except Exception:
+        # Рейтинг догрузит периодическая перестройка, до этого /user/profile отвечает 503
+        logging.getLogger(__name__).exception('Не удалось загрузить рейтинг при старте')
+    if LEADERBOARD_REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(refresh_leaderboard_periodically()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await seat_feed.stop()
+    images.shutdown()
+    await engine.dispose()
+    mark_worker_stopped()
+
 
 app = FastAPI(title="Media live app", 
               description="Backend", 
               version="1.0.0",
+              lifespan=lifespan,
+              # JSON-ответы всех маршрутов сериализуются через orjson
+              default_response_class=ORJSONResponse,
               )
 
 origins = [
@@ -20,12 +68,27 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(UploadRejected)
+async def upload_rejected(request: Request, exc: UploadRejected):
+    return ORJSONResponse(status_code=exc.status_code, content={"detail": exc.message})
 
 
 app.include_router(user_router, prefix="/user", tags=["User"])
 app.include_router(admin_router, prefix="/admin", tags=["Admin"])
+app.include_router(media_router, tags=["Media"])
 
 @app.get('/')
 async def start():
     return {"message": "FastAPI start..."}
 
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
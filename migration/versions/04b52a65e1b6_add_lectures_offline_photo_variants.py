@@ -0,0 +1,28 @@
+"""Add lectures offline_photo_variants
+
+Revision ID: 04b52a65e1b6
+Revises: 9c32dd17d1e7
+Create Date: 2026-10-18 13:05:52.870914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '04b52a65e1b6'
+down_revision: Union[str, None] = '9c32dd17d1e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('lectures', sa.Column('offline_photo_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('lectures', 'offline_photo_variants')
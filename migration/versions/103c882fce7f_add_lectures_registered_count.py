@@ -0,0 +1,41 @@
+"""Add lectures registered_count
+
+Revision ID: 103c882fce7f
+Revises: c6369170039c
+Create Date: 2026-10-18 10:12:41.532204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '103c882fce7f'
+down_revision: Union[str, None] = 'c6369170039c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('lectures', sa.Column('registered_count', sa.Integer(), server_default='0', nullable=False))
+    # Заполняем счётчик по уже существующим регистрациям
+    op.execute(
+        """
+        UPDATE lectures
+        SET registered_count = registrations.total
+        FROM (
+            SELECT lecture_id, count(*) AS total
+            FROM lecture_registrations
+            GROUP BY lecture_id
+        ) AS registrations
+        WHERE lectures.id = registrations.lecture_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('lectures', 'registered_count')
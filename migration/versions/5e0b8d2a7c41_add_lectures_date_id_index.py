@@ -0,0 +1,28 @@
+"""Add lectures (date, id) index
+
+Revision ID: 5e0b8d2a7c41
+Revises: 915ae83dc93e
+Create Date: 2026-10-18 18:02:51.730214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0b8d2a7c41'
+down_revision: Union[str, None] = '915ae83dc93e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_lectures_date_id', 'lectures', ['date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_lectures_date_id', table_name='lectures')
@@ -0,0 +1,28 @@
+"""Add lecture_registrations checked_in_at
+
+Revision ID: 915ae83dc93e
+Revises: 04b52a65e1b6
+Create Date: 2026-10-18 14:21:37.406158
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '915ae83dc93e'
+down_revision: Union[str, None] = '04b52a65e1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('lecture_registrations', sa.Column('checked_in_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('lecture_registrations', 'checked_in_at')
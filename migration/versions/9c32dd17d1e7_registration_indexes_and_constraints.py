@@ -0,0 +1,50 @@
+"""Registration indexes and constraints
+
+Revision ID: 9c32dd17d1e7
+Revises: 103c882fce7f
+Create Date: 2026-10-18 11:40:08.214377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c32dd17d1e7'
+down_revision: Union[str, None] = '103c882fce7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Перед созданием уникального ограничения убираем дубли регистраций, оставляя самую раннюю
+    op.execute(
+        """
+        DELETE FROM lecture_registrations AS duplicate
+        USING lecture_registrations AS original
+        WHERE duplicate.user_id = original.user_id
+          AND duplicate.lecture_id = original.lecture_id
+          AND duplicate.id > original.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE lectures
+        SET registered_count = (
+            SELECT count(*) FROM lecture_registrations WHERE lecture_registrations.lecture_id = lectures.id
+        )
+        """
+    )
+    op.create_unique_constraint('uq_lecture_registrations_user_id_lecture_id', 'lecture_registrations', ['user_id', 'lecture_id'])
+    op.create_index(op.f('ix_lecture_registrations_lecture_id'), 'lecture_registrations', ['lecture_id'], unique=False)
+    op.create_index(op.f('ix_users_username_tg'), 'users', ['username_tg'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_username_tg'), table_name='users')
+    op.drop_index(op.f('ix_lecture_registrations_lecture_id'), table_name='lecture_registrations')
+    op.drop_constraint('uq_lecture_registrations_user_id_lecture_id', 'lecture_registrations', type_='unique')
@@ -0,0 +1,44 @@
+"""Add type_mero.registered_peoples and members.telegram index
+
+Revision ID: a3f19c6e2d57
+Revises: 5e0b8d2a7c41
+Create Date: 2026-10-18 19:24:07.418532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f19c6e2d57'
+down_revision: Union[str, None] = '5e0b8d2a7c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('type_mero', sa.Column('registered_peoples', sa.Integer(), server_default='0', nullable=False))
+    # Заполняем счётчик по уже зарегистрированным участникам команд
+    op.execute(
+        """
+        UPDATE type_mero
+        SET registered_peoples = members.total
+        FROM (
+            SELECT reg_commands.category_id, count(*) AS total
+            FROM members
+            JOIN reg_commands ON reg_commands.id = members.command_id
+            GROUP BY reg_commands.category_id
+        ) AS members
+        WHERE type_mero.id = members.category_id
+        """
+    )
+    op.create_index(op.f('ix_members_telegram'), 'members', ['telegram'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_members_telegram'), table_name='members')
+    op.drop_column('type_mero', 'registered_peoples')
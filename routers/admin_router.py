@@ -1,10 +1,119 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, HttpUrl
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import logging
-from typing import Optional, List
+from typing import Optional, List, Literal
+from database.dao import BaseDAO
+from database.db import engine
+from database.session import get_session
+from database.cache import lecture_catalog
+from database.coalescer import registration_coalescer
+from database.seat_feed import seat_feed
+from services.tickets import ticket_cache, verify_ticket, InvalidTicket
+from services.auth import require_admin
+from services.exports import REGISTRATION_COLUMNS, TEAM_COLUMNS, XLSX_MEDIA_TYPE, export_response
+from services.lecture_import import InvalidImport, parse_records, validate_lectures
+from database.leaderboard import leaderboard
+from schemas.admin_schemas import (CheckInBatchRequest, CheckInBatchResponse, LectureImportResponse,
+                                   ScoreAwardRequest, ScoreAwardResponse)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-admin_router = APIRouter()
+# Все ручки администратора — только по сессии с is_admin
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@admin_router.get('/cache',
+                  description='Cache hit/miss statistics of this worker')
+async def get_cache_stats():
+    return {
+        "lectures": lecture_catalog.stats(),
+        "tickets": ticket_cache.stats(),
+        "registration_coalescer": registration_coalescer.stats(),
+        "seat_feed": seat_feed.stats(),
+        "leaderboard": leaderboard.stats(),
+    }
+
+
+@admin_router.get('/db/pool',
+                  description='Connection pool saturation of this worker (checked out, overflow, opened connections, checkout time)')
+async def get_pool_stats():
+    return engine.pool.stats()
+
+
+@admin_router.get('/tickets/verify',
+                  description='Verify QR ticket signature without database access')
+async def verify_qr_ticket(token: str):
+    try:
+        claims = verify_ticket(token)
+    except InvalidTicket as e:
+        return {"valid": False, "reason": e.reason}
+    return {"valid": True, "user_id": claims.user_id, "lecture_id": claims.lecture_id}
+
+
+@admin_router.post('/checkin/batch',
+                   response_model=CheckInBatchResponse,
+                   description='Verify a batch of scanned QR tickets and mark attendance')
+async def check_in_batch(request: CheckInBatchRequest, session: AsyncSession = Depends(get_session)):
+    results = await BaseDAO.check_in_tickets(request.tickets, lecture_id=request.lecture_id, session=session)
+    logger.info(f'Пакет прохода: {len(request.tickets)} билетов, '
+                f'отмечено {sum(result["status"] == "checked_in" for result in results)}')
+    return CheckInBatchResponse(results=results)
+
+
+@admin_router.get('/export/registrations',
+                  description='Stream lecture registrations with user and lecture data as CSV or XLSX',
+                  responses={200: {'content': {'text/csv': {}, XLSX_MEDIA_TYPE: {}}}})
+async def export_registrations(lecture_id: Optional[int] = None, fmt: Literal["csv", "xlsx"] = "csv"):
+    file_name = f"registrations-{lecture_id}" if lecture_id is not None else "registrations"
+    return export_response(fmt, file_name, REGISTRATION_COLUMNS, BaseDAO.stream_registrations(lecture_id))
+
+
+@admin_router.get('/export/teams',
+                  description='Stream teams with their members as CSV or XLSX',
+                  responses={200: {'content': {'text/csv': {}, XLSX_MEDIA_TYPE: {}}}})
+async def export_teams(category_id: Optional[int] = None, fmt: Literal["csv", "xlsx"] = "csv"):
+    file_name = f"teams-{category_id}" if category_id is not None else "teams"
+    return export_response(fmt, file_name, TEAM_COLUMNS, BaseDAO.stream_teams(category_id))
+
+
+@admin_router.post('/lectures/import',
+                   response_model=LectureImportResponse,
+                   status_code=201,
+                   description='Create a batch of lectures from a JSON array (application/json) or CSV with a header '
+                               '(text/csv). The whole batch is validated first; if any row is invalid nothing is '
+                               'created and per-row errors are returned. date and end_time without a UTC offset '
+                               'are taken as UTC',
+                   responses={
+                       400: {'descr': 'Body cannot be parsed or batch is too large'},
+                       422: {'descr': 'Some rows are invalid, nothing created', 'model': LectureImportResponse},}
+                   )
+async def import_lectures(request: Request, session: AsyncSession = Depends(get_session)):
+    try:
+        records = parse_records(await request.body(), request.headers.get("content-type", ""))
+    except InvalidImport as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lectures, errors = validate_lectures(records)
+    if errors:
+        return ORJSONResponse(status_code=422,
+                              content=LectureImportResponse(created=[], errors=errors).model_dump(mode="json"))
+
+    created = await BaseDAO.create_lectures(lectures, session=session)
+    logger.info(f'Импорт лекций: создано {len(created)}')
+    return LectureImportResponse(created=created, errors=[])
+
+
+@admin_router.post('/score',
+                   response_model=ScoreAwardResponse,
+                   description='Add (or subtract with a negative delta) points to a user',
+                   responses={404: {'descr': 'User not found'},})
+async def award_score(request: ScoreAwardRequest, session: AsyncSession = Depends(get_session)):
+    score = await BaseDAO.add_score(request.user_id, request.delta, session=session)
+    if score is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    logger.info(f'Баллы пользователя {request.user_id}: {request.delta:+} -> {score}')
+    return ScoreAwardResponse(user_id=request.user_id, score=score)
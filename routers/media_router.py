@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Request
+
+from services.storage import serve_upload, UPLOAD_URL_PREFIX
+
+media_router = APIRouter()
+
+
+@media_router.api_route('/uploads/{file_name}',
+                        methods=["GET", "HEAD"],
+                        description='Serve uploaded file with long-lived caching')
+async def get_upload(file_name: str, request: Request):
+    return await serve_upload(f"{UPLOAD_URL_PREFIX}{file_name}", request)
@@ -1,10 +1,24 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import HttpUrl
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.dao import BaseDAO
+from database.cache import lecture_catalog
+from database.results import QrStatus
+from database.seat_feed import seat_feed, stream_events
+from database.leaderboard import LEADERBOARD_MAX_TOP_SIZE, LEADERBOARD_NEIGHBORS, LEADERBOARD_TOP_SIZE, leaderboard
+from database.lecture_query import LectureQuery, InvalidLectureQuery, LECTURES_PAGE_SIZE
+from database.session import get_session, get_read_session
+from services.http_cache import etag_matches
+from services.storage import serve_upload
+from services.auth import SessionUser, InvalidInitData, get_current_user, issue_session, verify_init_data
 
 import logging
-from typing import Optional, List
-from schemas.user_schemas import AuthRequest, AuthResponse
+from datetime import datetime
+from typing import Optional, List, Literal
+from schemas.lecture_schemas import LecturePage
+from schemas.user_schemas import (AuthRequest, AuthResponse, LectureRegistrationRequest, LectureRegistrationResponse,
+                                  LeaderboardResponse, ProfileResponse)
 
 
 logging.basicConfig(level=logging.INFO)
@@ -12,43 +26,174 @@ logger = logging.getLogger(__name__)
 
 user_router = APIRouter()
 
+PHOTO_CACHE_CONTROL = "public, max-age=300, must-revalidate"
 
-@user_router.get('/',
-                 response_model=AuthRequest,
-                 description='Check type of user',
+
+@user_router.post('/',
+                  response_model=AuthResponse,
+                  description='Sign in with Telegram WebApp initData and get a session token',
+                  responses={
+                      200: {'descr': 'Auth complete'},
+                      401: {'descr': 'Invalid initData'},
+                      500: {'descr': 'SERVER ERROR'},}
+                  )
+async def authenticate(request: AuthRequest, session: AsyncSession = Depends(get_session)):
+    try:
+        telegram_user = verify_init_data(request.init_data)
+    except InvalidInitData as e:
+        logger.info(f'Отклонены initData: {e.reason}')
+        raise HTTPException(status_code=401, detail="Недействительные данные Telegram")
+
+    identity = await BaseDAO.check_auth(
+        first_name=telegram_user.first_name,
+        last_name=telegram_user.last_name,
+        user_tg=str(telegram_user.id),
+        username_tg=telegram_user.username,
+        session=session,
+    )
+    token, expires_at = issue_session(identity.id, identity.is_admin)
+    logger.info(f'Аутентификация пользователя: telegram_id={identity.user_tg}, admin={identity.is_admin}')
+    return AuthResponse(is_admin=identity.is_admin, user_tg=identity.user_tg, token=token, expires_at=expires_at)
+
+
+@user_router.get('/lections',
+                 description='Get a page of lectures with remaining seats. '
+                             'Past lectures are hidden unless include_past is set; '
+                             'pass next_cursor from the previous page as cursor to get the next one',
+                 responses={
+                     200: {'descr': 'Lectures page: items and next_cursor', 'model': LecturePage},
+                     304: {'descr': 'Not modified'},
+                     400: {'descr': 'Invalid fields, cursor or limit'},}
+                 )
+async def get_all_lections(if_none_match: Optional[str] = Header(default=None),
+                           date_from: Optional[datetime] = None,
+                           date_to: Optional[datetime] = None,
+                           lecture_format: Optional[Literal["online", "offline"]] = Query(default=None, alias="format"),
+                           has_seats: bool = False,
+                           include_past: bool = False,
+                           cursor: Optional[str] = None,
+                           limit: int = LECTURES_PAGE_SIZE,
+                           fields: Optional[str] = Query(default=None,
+                                                         description='"list", "full" or comma-separated field names'),
+                           session: AsyncSession = Depends(get_read_session)):
+    try:
+        query = LectureQuery.from_params(date_from=date_from, date_to=date_to, format=lecture_format,
+                                         has_seats=has_seats, include_past=include_past,
+                                         cursor=cursor, limit=limit, fields=fields)
+    except InvalidLectureQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Клиент уже видел актуальную версию страницы — отвечаем 304 без обращения к БД
+    etag = lecture_catalog.current_etag(query)
+    if etag is not None and etag_matches(if_none_match, etag):
+        lecture_catalog.record_not_modified()
+        return Response(status_code=304, headers={"ETag": etag})
+
+    body, etag = await lecture_catalog.get(query, lambda: BaseDAO.get_all_lectures(query, session=session))
+    if etag_matches(if_none_match, etag):
+        lecture_catalog.record_not_modified()
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@user_router.get("/lections/seats",
+                 description='Server-sent events with remaining seats of lectures whose seat counts changed. '
+                             'Subscribe before loading /lections; on the "resync" event reload the list and reconnect',
                  responses={
-                     200: {'descr': 'Auth complete'},
-                     500: {'descr': 'SERVER ERROR'},}
+                     200: {'content': {'text/event-stream': {}}},
+                     503: {'descr': 'Seat feed is not running'},}
                  )
-async def authenticate(request: AuthRequest):
-    logger.info(f'Аутентификация пользователя: telegram_id=')
-    try: 
-        is_admin = await BaseDAO.check_auth(
-            first_name=request.first_name,
-            last_name=request.last_name,
-            user_tg=request.tg_id,
-            username_tg=request.username_tg
-        )
-    except:
-        ...
+async def get_seat_updates():
+    if not seat_feed.running:
+        raise HTTPException(status_code=503, detail="Поток мест недоступен")
+    return StreamingResponse(stream_events(seat_feed.subscribe()),
+                             media_type="text/event-stream",
+                             # Без буферизации в nginx события уходят клиенту сразу
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    
 
-@user_router.get('/lections')
-async def get_all_lections():
-    return {"message": "Такая же просто заглушка"}
+@user_router.post("/lections/regestartion",
+                  response_model=LectureRegistrationResponse,
+                  description='Register user for lecture')
+async def get_regestration(request: LectureRegistrationRequest,
+                           user: SessionUser = Depends(get_current_user),
+                           session: AsyncSession = Depends(get_session)):
+    result = await BaseDAO.register_for_lecture(lecture_id=request.lecture_id,
+                                                user_id=user.user_id,
+                                                session=session)
+    logger.info(f'Регистрация на лекцию {request.lecture_id}: пользователь {user.user_id} -> {result.status.value}')
+    return LectureRegistrationResponse(status=result.status,
+                                       message=result.message,
+                                       remaining_seats=result.remaining_seats)
 
 
-@user_router.get("/lections/regestartion")
-async def get_regestration():
-    return {"message" : "Ручка записи на лекцию"}
+@user_router.api_route("/lections/get_photo",
+                       methods=["GET", "HEAD"],
+                       description='Get lecture route photo sized for the client')
+async def get_photo_lection(request: Request,
+                            lection_id: int,
+                            width: Optional[int] = Query(default=None, gt=0),
+                            accept: Optional[str] = Header(default=None),
+                            session: AsyncSession = Depends(get_read_session)):
+    photo = await BaseDAO.get_lecture_photo(lection_id, width=width, accept_webp="image/webp" in (accept or ""),
+                                            session=session)
+    if photo is None:
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    # Фото лекции могут заменить, поэтому адрес ручки кэшируется ненадолго, а сам файл — навсегда по /uploads/
+    return await serve_upload(photo, request, cache_control=PHOTO_CACHE_CONTROL)
 
 
-@user_router.get("/lections/get_photo")
-async def get_photo_lection(lection_id: int):
-    return {"message": "Получение фото марщрута всплывающим окном"}
+@user_router.get("/lections/qr",
+                 description='Get QR ticket for lecture',
+                 responses={
+                     200: {'content': {'image/png': {}, 'image/svg+xml': {}}},
+                     403: {'descr': 'QR not available'},
+                     404: {'descr': 'Lecture not found'},}
+                 )
+async def get_lection_qr(lection_id: int, fmt: Literal["png", "svg"] = "png",
+                         user: SessionUser = Depends(get_current_user),
+                         session: AsyncSession = Depends(get_read_session)):
+    result = await BaseDAO.check_registration_and_get_qr(lection_id, user.user_id, fmt=fmt, session=session)
+    if result.status is QrStatus.LECTURE_NOT_FOUND:
+        raise HTTPException(status_code=404, detail=result.message)
+    if result.status is not QrStatus.ISSUED:
+        raise HTTPException(status_code=403, detail=result.message)
+    return Response(content=result.image,
+                    media_type=result.media_type,
+                    headers={"Cache-Control": "private, max-age=3600", "X-Ticket": result.token})
 
 
-@user_router.get("/profile")
-async def get_score():
-    return {"message": "Получение баллов участника, а также его команд"}
+@user_router.get("/profile",
+                 response_model=ProfileResponse,
+                 description='User score, leaderboard rank and neighbors above and below',
+                 responses={
+                     404: {'descr': 'User is not in the leaderboard'},
+                     503: {'descr': 'Leaderboard is not loaded yet'},}
+                 )
+async def get_score(neighbors: int = Query(default=LEADERBOARD_NEIGHBORS, ge=0, le=10),
+                    user: SessionUser = Depends(get_current_user)):
+    if not leaderboard.loaded:
+        raise HTTPException(status_code=503, detail="Рейтинг ещё не загружен")
+    found = leaderboard.around(user.user_id, neighbors)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден в рейтинге")
+    entry, window = found
+    return ProfileResponse(user_id=entry.user_id,
+                           user_name=entry.user_name,
+                           score=entry.score,
+                           rank=entry.rank,
+                           total=len(leaderboard),
+                           neighbors=window)
+
+
+@user_router.get("/leaderboard",
+                 response_model=LeaderboardResponse,
+                 description='Top users by score; users with equal scores share a rank',
+                 responses={503: {'descr': 'Leaderboard is not loaded yet'},}
+                 )
+async def get_leaderboard(limit: int = Query(default=LEADERBOARD_TOP_SIZE, ge=1, le=LEADERBOARD_MAX_TOP_SIZE),
+                          user: SessionUser = Depends(get_current_user)):
+    if not leaderboard.loaded:
+        raise HTTPException(status_code=503, detail="Рейтинг ещё не загружен")
+    return LeaderboardResponse(total=len(leaderboard), entries=leaderboard.top(limit))
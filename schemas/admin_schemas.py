@@ -0,0 +1,37 @@
+from pydantic import BaseModel, Field
+from typing import Optional, Literal
+from datetime import datetime
+from schemas.lecture_schemas import LectureOut
+
+class CheckInBatchRequest(BaseModel):
+    tickets: list[str] = Field(min_length=1, max_length=1000)
+    lecture_id: Optional[int] = None
+
+class CheckInResult(BaseModel):
+    token: str
+    status: Literal["checked_in", "already_checked_in", "not_registered", "wrong_lecture", "invalid"]
+    reason: Optional[str] = None
+    user_id: Optional[int] = None
+    lecture_id: Optional[int] = None
+    checked_in_at: Optional[datetime] = None
+
+class CheckInBatchResponse(BaseModel):
+    results: list[CheckInResult]
+
+class LectureImportError(BaseModel):
+    row: int
+    field: Optional[str] = None
+    message: str
+
+class LectureImportResponse(BaseModel):
+    created: list[LectureOut]
+    errors: list[LectureImportError]
+
+class ScoreAwardRequest(BaseModel):
+    user_id: int
+    # NaN и бесконечность сломали бы порядок ключей рейтинга (database.leaderboard)
+    delta: float = Field(allow_inf_nan=False)
+
+class ScoreAwardResponse(BaseModel):
+    user_id: int
+    score: float
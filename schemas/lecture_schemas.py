@@ -0,0 +1,91 @@
+import functools
+from datetime import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, create_model, field_validator, model_validator
+
+from database.timeutil import naive_utc
+
+
+class LectureOut(BaseModel):
+    '''Лекция в ответах API. Заполняется напрямую из ORM-объекта Lectures или строки запроса.'''
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: str
+    speaker: str
+    date: datetime
+    end_time: datetime
+    max_seats: int
+    remaining_seats: int
+    format: str
+    conference_link: Optional[str] = None
+    offline_map_link: Optional[str] = None
+    offline_photo: Optional[str] = None
+
+
+class LectureIn(BaseModel):
+    '''
+    Новая лекция при массовом импорте. Ограничения повторяют колонки Lectures,
+    плюс согласованность полей: лекция заканчивается после начала, у онлайн-лекции
+    есть ссылка на конференцию, у офлайн-лекции — ссылка на карту.
+    date и end_time приводятся к наивному UTC (database.timeutil), как и все колонки дат;
+    время без пояса считается временем UTC.
+    '''
+    title: str = Field(min_length=1, max_length=100)
+    speaker: str = Field(min_length=1, max_length=100)
+    date: datetime
+    end_time: datetime
+    max_seats: int = Field(gt=0)
+    format: Literal["online", "offline"]
+    conference_link: Optional[str] = Field(default=None, max_length=255)
+    offline_map_link: Optional[str] = Field(default=None, max_length=255)
+    offline_photo: Optional[str] = Field(default=None, max_length=255)
+
+    @field_validator("date", "end_time")
+    @classmethod
+    def _naive_utc(cls, value: datetime) -> datetime:
+        return naive_utc(value)
+
+    @model_validator(mode="after")
+    def _check_consistency(self) -> "LectureIn":
+        if self.end_time <= self.date:
+            raise ValueError("end_time должен быть позже date")
+        if self.format == "online" and not self.conference_link:
+            raise ValueError("Для онлайн-лекции нужен conference_link")
+        if self.format == "offline" and not self.offline_map_link:
+            raise ValueError("Для офлайн-лекции нужен offline_map_link")
+        return self
+
+
+class LecturePage(BaseModel):
+    items: list[LectureOut]
+    next_cursor: Optional[str] = None
+
+
+class SeatUpdate(BaseModel):
+    '''Свободные места лекции в потоке изменений; у удалённой лекции места не заданы.'''
+    id: int
+    remaining_seats: Optional[int] = None
+    max_seats: Optional[int] = None
+
+
+@functools.lru_cache(maxsize=None)
+def lecture_page_model(fields: tuple[str, ...]) -> type[LecturePage]:
+    '''
+    Модель страницы списка лекций, в элементах которой только поля fields (в порядке LectureOut).
+    Модели проекций создаются один раз на набор полей.
+    '''
+    if fields == tuple(LectureOut.model_fields):
+        return LecturePage
+
+    item_model = create_model(
+        f"LectureOut[{','.join(fields)}]",
+        __config__=LectureOut.model_config,
+        **{field: (info.annotation, info) for field, info in LectureOut.model_fields.items() if field in fields},
+    )
+    return create_model(
+        f"LecturePage[{','.join(fields)}]",
+        __base__=LecturePage,
+        items=(list[item_model], ...),
+    )
@@ -1,12 +1,40 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
+from database.results import RegistrationStatus
 
 class AuthRequest(BaseModel):
-    first_name: str
-    last_name: str
-    user_tg: str
-    username_tg: str 
+    init_data: str
 
 class AuthResponse(BaseModel):
     is_admin: bool
     user_tg: str
+    token: str
+    expires_at: int
+
+class LectureRegistrationRequest(BaseModel):
+    lecture_id: int
+
+class LectureRegistrationResponse(BaseModel):
+    status: RegistrationStatus
+    message: str
+    remaining_seats: Optional[int] = None
+
+class LeaderboardEntryResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    rank: int
+    user_id: int
+    user_name: str
+    score: float
+
+class LeaderboardResponse(BaseModel):
+    total: int
+    entries: list[LeaderboardEntryResponse]
 
+class ProfileResponse(BaseModel):
+    user_id: int
+    user_name: str
+    score: float
+    rank: int
+    total: int
+    neighbors: list[LeaderboardEntryResponse]
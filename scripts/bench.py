@@ -0,0 +1,231 @@
+"""
+Нагрузочный бенчмарк «открытия регистрации» на реалистичных объёмах.
+
+Наполняет локальную БД (см. scripts/seed.py): тысячи пользователей, сотни лекций,
+100k регистраций. Затем в том же процессе гоняет приложение FastAPI через
+httpx.ASGITransport конкурентными клиентами по сценариям:
+
+    - lectures: GET /user/lections — список лекций;
+    - register: POST /user/lections/regestartion — разные пользователи штурмуют
+      --hot-lectures лекций на --seats мест каждая;
+    - auth: POST /user/ — вход пользователя по initData (check_auth); initData
+      подписываются TELEGRAM_BOT_TOKEN, без него сценарий пропускается.
+
+Для каждого сценария выводятся запросы в секунду, p50/p95/p99 задержки, коды ответов
+и ошибки, для register — ещё число проданных сверх вместимости мест (должно быть 0).
+Результат пишется в JSON (--output); с --baseline выводится сравнение с прошлым прогоном.
+
+Запуск из корня репозитория (DATABASE_URL — локальная база с применёнными миграциями):
+
+    python -m scripts.bench --force --output bench.json
+    python -m scripts.bench --force --baseline bench.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import httpx
+from sqlalchemy import func, select
+
+from database.db import engine, DB_POOL_SIZE, DB_MAX_OVERFLOW
+from database.models import Lectures, LectureRegistrations
+from main import app
+from services.auth import TELEGRAM_BOT_TOKEN, init_data_hash, issue_session
+from scripts.bench_coalescer import percentile
+from scripts.seed import seed
+
+SCENARIOS = ("lectures", "register", "auth")
+
+
+def signed_init_data(user: int) -> str:
+    '''initData мини-приложения для user<N> (Telegram ID 100000000 + N), подписанные как это делает Telegram.'''
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"bench{user}",
+        "user": json.dumps({"id": 100000000 + user, "first_name": "User", "last_name": str(user),
+                            "username": f"user{user}"}, separators=(",", ":")),
+    }
+    fields["hash"] = init_data_hash(fields)
+    return urlencode(fields)
+
+
+def scenario_requests(name: str, args, hot_lectures: list[int]):
+    '''Аргументы httpx-запросов сценария; i-й запрос идёт от пользователя user<i> (его id после наполнения — i).'''
+    for i in range(1, args.requests + 1):
+        user = (i - 1) % args.users + 1
+        if name == "lectures":
+            yield "GET", "/user/lections", {}
+        elif name == "register":
+            token, _ = issue_session(user, is_admin=False)
+            yield "POST", "/user/lections/regestartion", {
+                "json": {"lecture_id": hot_lectures[i % len(hot_lectures)]},
+                "headers": {"Authorization": f"Bearer {token}"},
+            }
+        elif name == "auth":
+            yield "POST", "/user/", {"json": {"init_data": signed_init_data(user)}}
+
+
+async def prepare_hot_lectures(args) -> list[int]:
+    '''Будущие лекции с пустыми регистрациями и вместимостью --seats: на них идёт штурм.'''
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            select(Lectures.id).where(Lectures.date > func.now()).order_by(Lectures.id).limit(args.hot_lectures)
+        )
+        hot_lectures = list(result.scalars())
+        await conn.execute(LectureRegistrations.__table__.delete().where(LectureRegistrations.lecture_id.in_(hot_lectures)))
+        await conn.execute(
+            Lectures.__table__.update()
+            .where(Lectures.id.in_(hot_lectures))
+            .values(max_seats=args.seats, registered_count=0)
+        )
+    return hot_lectures
+
+
+async def oversold_seats(hot_lectures: list[int]) -> dict:
+    taken = (
+        select(LectureRegistrations.lecture_id, func.count().label("taken"))
+        .where(LectureRegistrations.lecture_id.in_(hot_lectures))
+        .group_by(LectureRegistrations.lecture_id)
+        .subquery()
+    )
+    query = (
+        select(Lectures.id, Lectures.max_seats, Lectures.registered_count, func.coalesce(taken.c.taken, 0).label("taken"))
+        .outerjoin(taken, taken.c.lecture_id == Lectures.id)
+        .where(Lectures.id.in_(hot_lectures))
+    )
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+    return {
+        "registered": sum(row.taken for row in rows),
+        "oversold": sum(max(row.taken - row.max_seats, 0) for row in rows),
+        "counter_drift": sum(abs(row.registered_count - row.taken) for row in rows),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, args, hot_lectures: list[int]) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    statuses = Counter()
+
+    async def one(method: str, url: str, kwargs: dict):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(*request) for request in scenario_requests(name, args, hot_lectures)))
+    elapsed = time.perf_counter() - started
+
+    stats = {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "statuses": dict(statuses),
+        "errors": sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500),
+    }
+    if name == "register":
+        stats.update(await oversold_seats(hot_lectures))
+    return stats
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results: dict, baseline: dict):
+    for name, stats in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if before[key]:
+                changes.append(f"{key} {(stats[key] - before[key]) / before[key] * 100:+.1f}%")
+        print(f"{name:>9} vs {baseline.get('git_revision') or 'baseline'}: {'  '.join(changes)}")
+
+
+async def main(args) -> int:
+    if not args.force:
+        print("Скрипт очищает таблицы users, lectures и lecture_registrations. Запустите с --force.")
+        return 2
+
+    # Логи каждой регистрации и очереди на блокировке лекции под нагрузкой искажают замеры
+    logging.disable(logging.INFO)
+    logging.getLogger("database.profiling").setLevel(logging.ERROR)
+
+    await seed(engine, users=args.users, lectures=args.lectures, registrations=args.registrations)
+    hot_lectures = await prepare_hot_lectures(args)
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "config": {
+            **{key: value for key, value in vars(args).items() if key not in ("force", "output", "baseline")},
+            "db_pool_size": DB_POOL_SIZE,
+            "db_max_overflow": DB_MAX_OVERFLOW,
+            "registration_coalesce_ms": float(os.getenv("REGISTRATION_COALESCE_MS", "0")),
+        },
+        "scenarios": {},
+    }
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name in args.scenarios:
+            if name == "auth" and not TELEGRAM_BOT_TOKEN:
+                print("     auth: пропущен, TELEGRAM_BOT_TOKEN не задан")
+                continue
+            stats = await run_scenario(client, name, args, hot_lectures)
+            results["scenarios"][name] = stats
+            line = (f"{name:>9}: {stats['rps']:8.0f} req/s  p50 {stats['p50_ms']:7.1f} ms  "
+                    f"p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms  errors {stats['errors']}")
+            if name == "register":
+                line += f"  registered {stats['registered']}  oversold {stats['oversold']}"
+            print(line)
+
+    await engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline) as file:
+            print_comparison(results, json.load(file))
+
+    oversold = results["scenarios"].get("register", {}).get("oversold", 0)
+    return 1 if oversold else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк регистрации на лекции")
+    parser.add_argument("--force", action="store_true", help="разрешить очистку и наполнение базы")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--lectures", type=int, default=300)
+    parser.add_argument("--registrations", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=5000, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--hot-lectures", type=int, default=5)
+    parser.add_argument("--seats", type=int, default=300)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,96 @@
+"""
+Сравнение регистрации на одну лекцию с объединением запросов (RegistrationCoalescer) и без него.
+
+Для каждого режима создаётся лекция на --seats мест, после чего --requests разных
+пользователей одновременно (не более --concurrency в полёте) вызывают
+BaseDAO.register_for_lecture. Выводятся запросы в секунду, p50/p99 задержки
+и число проданных сверх вместимости мест (должно быть 0).
+
+Запуск из корня репозитория (DATABASE_URL — локальная база с применёнными миграциями):
+
+    python -m scripts.bench_coalescer --force
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from database.coalescer import registration_coalescer
+from database.dao import BaseDAO
+from database.db import engine
+from database.models import Lectures, LectureRegistrations
+from scripts.seed import seed
+
+
+def percentile(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+async def run(window_ms: float, args) -> dict:
+    registration_coalescer.window_ms = window_ms
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            insert(Lectures)
+            .values(title="Benchmark", speaker="Benchmark", date=datetime.now() + timedelta(days=1),
+                    end_time=datetime.now() + timedelta(days=1, hours=1), max_seats=args.seats, format="online")
+            .returning(Lectures.id)
+        )
+        lecture_id = result.scalar_one()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            # После наполнения у user<N> id равен N
+            await BaseDAO.register_for_lecture(lecture_id, i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(1, args.requests + 1)))
+    elapsed = time.perf_counter() - started
+
+    async with engine.connect() as conn:
+        taken = (await conn.execute(
+            select(func.count()).select_from(LectureRegistrations).where(LectureRegistrations.lecture_id == lecture_id)
+        )).scalar_one()
+
+    return {
+        "window_ms": window_ms,
+        "rps": args.requests / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "registered": taken,
+        "oversold": max(taken - args.seats, 0),
+    }
+
+
+async def main(args) -> int:
+    if not args.force:
+        print("Скрипт очищает таблицы users, lectures и lecture_registrations. Запустите с --force.")
+        return 2
+
+    await seed(engine, users=args.requests, lectures=1, registrations=0)
+    for window_ms in (0, args.window_ms):
+        stats = await run(window_ms, args)
+        print(f"coalescing {'off' if window_ms == 0 else f'{window_ms:g} ms':>8}: "
+              f"{stats['rps']:8.0f} req/s  p50 {stats['p50_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms  "
+              f"registered {stats['registered']}  oversold {stats['oversold']}")
+    await engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк объединения регистраций")
+    parser.add_argument("--force", action="store_true", help="разрешить очистку и наполнение базы")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--seats", type=int, default=1000)
+    parser.add_argument("--window-ms", type=float, default=5)
+    sys.exit(asyncio.run(main(parser.parse_args())))
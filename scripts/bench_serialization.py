@@ -0,0 +1,99 @@
+"""
+Микробенчмарк сериализации списка лекций: время на 1000 лекций до и после
+перехода на модели pydantic (schemas/lecture_schemas.py) и ORJSONResponse.
+
+База не нужна: лекции создаются в памяти как объекты Lectures и строки запроса.
+Сравниваются:
+
+    - page: тело страницы GET /user/lections в кэше каталога — прежние словари через
+      jsonable_encoder + json.dumps против lecture_page_model(...).model_validate + model_dump_json;
+    - response: ответ маршрута с ORM-объектами — словари через jsonable_encoder + JSONResponse
+      против LectureOut.model_validate + ORJSONResponse (как FastAPI с response_model).
+
+Запуск из корня репозитория:
+
+    python -m scripts.bench_serialization --lectures 1000 --repeat 50
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from database.lecture_query import FIELD_PRESETS, LECTURE_FIELDS
+from database.models import Lectures
+from schemas.lecture_schemas import LectureOut, lecture_page_model
+
+
+def make_lectures(count: int) -> list[Lectures]:
+    start = datetime(2030, 1, 1, 10, 0)
+    return [
+        Lectures(id=i,
+                 title=f"Лекция {i}",
+                 speaker=f"Спикер {i % 50}",
+                 date=start + timedelta(hours=i),
+                 end_time=start + timedelta(hours=i, minutes=90),
+                 max_seats=300,
+                 registered_count=i % 300,
+                 format="online" if i % 2 else "offline",
+                 conference_link=f"https://meet.example.com/{i}" if i % 2 else None,
+                 offline_map_link=None if i % 2 else f"https://maps.example.com/{i}",
+                 offline_photo=None if i % 2 else f"uploads/{i}.jpg")
+        for i in range(1, count + 1)
+    ]
+
+
+def page_before(rows: list[dict], fields: tuple[str, ...]) -> bytes:
+    data = {"items": [{field: row[field] for field in fields} for row in rows], "next_cursor": None}
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def page_after(rows: list[dict], fields: tuple[str, ...]) -> bytes:
+    return lecture_page_model(fields).model_validate({"items": rows, "next_cursor": None}).model_dump_json().encode("utf-8")
+
+
+def response_before(lectures: list[Lectures]) -> bytes:
+    return JSONResponse(jsonable_encoder([{field: getattr(lecture, field) for field in LECTURE_FIELDS} for lecture in lectures])).body
+
+
+def response_after(lectures: list[Lectures]) -> bytes:
+    return ORJSONResponse([LectureOut.model_validate(lecture).model_dump(mode="json") for lecture in lectures]).body
+
+
+def measure(call, repeat: int) -> float:
+    '''Лучшее время одного вызова из repeat в миллисекундах: меньше всего шума от GC и планировщика.'''
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main(args):
+    lectures = make_lectures(args.lectures)
+    # Строки SELECT по колонкам: как row._asdict() в BaseDAO.get_all_lectures
+    rows = [{field: getattr(lecture, field) for field in LECTURE_FIELDS} for lecture in lectures]
+    scale = 1000 / args.lectures
+
+    cases = [
+        (f"page fields={name}", lambda f=fields: page_before(rows, f), lambda f=fields: page_after(rows, f))
+        for name, fields in FIELD_PRESETS.items()
+    ]
+    cases.append(("response (ORM)", lambda: response_before(lectures), lambda: response_after(lectures)))
+
+    print(f"{'':>18}  {'до, мс':>8}  {'после, мс':>9}  ускорение   (на 1000 лекций)")
+    for name, before, after in cases:
+        assert json.loads(before()) == json.loads(after()), f"{name}: ответы различаются"
+        before_ms = measure(before, args.repeat) * scale
+        after_ms = measure(after, args.repeat) * scale
+        print(f"{name:>18}  {before_ms:8.2f}  {after_ms:9.2f}  {before_ms / after_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарк сериализации списка лекций")
+    parser.add_argument("--lectures", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,116 @@
+"""
+Проверка лимита мест лекции при одновременной регистрации.
+
+Создаёт лекцию на --seats мест и --attempts пользователей, затем одновременно регистрирует
+всех через BaseDAO.register_for_lecture (не более --concurrency в полёте). После прогона сверяет:
+
+    - успешных регистраций ровно min(seats, attempts), остальные получили full;
+    - регистраций лекции в БД столько же;
+    - счётчик registered_count равен фактическому числу регистраций.
+
+Завершается с кодом 1 при любом нарушении. Создаёт только свою лекцию и своих пользователей
+и удаляет их после проверки. С --coalesce-ms > 0 проверяется путь объединителя регистраций.
+
+Запуск из корня репозитория (DATABASE_URL — локальная база с применёнными миграциями):
+
+    python -m scripts.check_lecture_capacity --seats 100 --attempts 1000
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from database.coalescer import registration_coalescer
+from database.dao import BaseDAO
+from database.db import engine
+from database.models import LectureRegistrations, Lectures, Users
+from database.results import RegistrationStatus
+from database.timeutil import utc_now
+
+
+async def main(args) -> int:
+    # Ожидание блокировки лекции под нагрузкой — ожидаемо, лог медленных запросов здесь лишний
+    logging.getLogger("database.profiling").setLevel(logging.ERROR)
+
+    registration_coalescer.window_ms = args.coalesce_ms
+    run_id = uuid.uuid4().hex[:8]
+    starts_at = utc_now() + timedelta(days=1)
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            insert(Lectures)
+            .values(title=f"Capacity check {run_id}", speaker="Capacity check", date=starts_at,
+                    end_time=starts_at + timedelta(hours=1), max_seats=args.seats, format="online",
+                    conference_link="https://example.com")
+            .returning(Lectures.id)
+        )
+        lecture_id = result.scalar_one()
+        result = await conn.execute(
+            insert(Users)
+            .values([{"user_name": f"Capacity {i}", "user_tg": f"cap-{run_id}-{i}",
+                      "username_tg": f"cap_{run_id}_{i}", "is_admin": False}
+                     for i in range(args.attempts)])
+            .returning(Users.id)
+        )
+        user_ids = result.scalars().all()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    statuses = Counter()
+
+    async def one(user_id: int):
+        async with semaphore:
+            result = await BaseDAO.register_for_lecture(lecture_id, user_id)
+            statuses[result.status] += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - started
+
+        async with engine.connect() as conn:
+            registered_count = (await conn.execute(
+                select(Lectures.registered_count).where(Lectures.id == lecture_id)
+            )).scalar_one()
+            registrations = (await conn.execute(
+                select(func.count()).select_from(LectureRegistrations).where(LectureRegistrations.lecture_id == lecture_id)
+            )).scalar_one()
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(delete(LectureRegistrations).where(LectureRegistrations.lecture_id == lecture_id))
+            await conn.execute(delete(Lectures).where(Lectures.id == lecture_id))
+            await conn.execute(delete(Users).where(Users.id.in_(user_ids)))
+        await engine.dispose()
+
+    expected = min(args.seats, args.attempts)
+    registered = statuses[RegistrationStatus.REGISTERED]
+    problems = []
+    if registered != expected:
+        problems.append(f"успешных регистраций {registered}, ожидалось {expected}")
+    if statuses[RegistrationStatus.FULL] != args.attempts - expected:
+        problems.append(f"отказов full {statuses[RegistrationStatus.FULL]}, ожидалось {args.attempts - expected}")
+    if registrations != expected:
+        problems.append(f"регистраций в БД {registrations}, ожидалось {expected}")
+    if registered_count != registrations:
+        problems.append(f"registered_count {registered_count} != регистраций {registrations}")
+
+    print(f"{args.attempts} регистраций за {elapsed:.2f} с: { {status.value: n for status, n in statuses.items()} }")
+    print(f"Регистраций {registrations} из {args.seats}, счётчик {registered_count}")
+    for problem in problems:
+        print(f"[FAIL] {problem}")
+    if not problems:
+        print("[ok] лимит мест лекции соблюдён")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка лимита мест лекции при одновременной регистрации")
+    parser.add_argument("--seats", type=int, default=100)
+    parser.add_argument("--attempts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--coalesce-ms", type=float, default=0, help="окно объединителя регистраций, 0 — без него")
+    sys.exit(asyncio.run(main(parser.parse_args())))
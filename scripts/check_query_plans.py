@@ -0,0 +1,136 @@
+"""
+Регрессионная проверка планов запросов BaseDAO.
+
+Наполняет локальную БД (см. scripts/seed.py), вызывает горячие методы BaseDAO,
+перехватывает все выполненные ими SQL-запросы и прогоняет каждый через EXPLAIN.
+Завершается с кодом 1, если какой-либо запрос читает таблицу от MIN_ROWS строк
+последовательным сканированием (Seq Scan) или метод выполнил больше запросов,
+чем заложено в его бюджете (например, в register_for_lecture добавился лишний round trip).
+
+Запуск из корня репозитория (DATABASE_URL должен указывать на локальную базу с применёнными миграциями):
+
+    python -m scripts.check_query_plans --force
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+
+from sqlalchemy import event, text
+
+from database.dao import BaseDAO
+from database.db import engine
+from database.lecture_query import LectureQuery, encode_cursor
+from database.profiling import assert_max_queries
+from scripts.seed import seed
+
+MIN_ROWS = 100_000
+
+USERS = 120_000
+LECTURES = 300
+REGISTRATIONS = 150_000
+
+
+def hot_calls():
+    '''
+    Горячие методы BaseDAO с аргументами, подходящими под наполненную базу,
+    и максимальным числом запросов на вызов.
+    '''
+    # После наполнения у user<N> id равен N
+    username = f"user{USERS // 2}"
+    user_id = USERS // 3
+    lecture_id = LECTURES - 1
+    return [
+        ("find_user_by_tg_id", 1, lambda: BaseDAO.find_user_by_tg_id(username)),
+        # Блокировка лекции с проверкой пользователя, вставка со счётчиком
+        ("register_for_lecture", 2, lambda: BaseDAO.register_for_lecture(lecture_id, user_id)),
+        ("check_registration_and_get_qr", 1, lambda: BaseDAO.check_registration_and_get_qr(lecture_id, user_id)),
+        ("unregister_from_lecture", 1, lambda: BaseDAO.unregister_from_lecture(lecture_id, user_id)),
+        ("get_all_lectures", 1, lambda: BaseDAO.get_all_lectures()),
+        ("get_all_lectures (archive page)", 1, lambda: BaseDAO.get_all_lectures(
+            LectureQuery.from_params(include_past=True, has_seats=True, fields="list",
+                                     cursor=encode_cursor(datetime(2000, 1, 1), 0)))),
+    ]
+
+
+def seq_scans(plan: dict):
+    '''Обходит дерево плана и возвращает имена таблиц, читаемых через Seq Scan.'''
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+async def capture_statements(name: str, max_queries: int, call) -> list[tuple[str, tuple]]:
+    '''
+    Выполняет вызов и возвращает его SQL-запросы.
+
+    Выбрасывает:
+        AssertionError, если запросов больше max_queries.
+    '''
+    captured = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        with assert_max_queries(max_queries, name):
+            await call()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+    return captured
+
+
+async def explain(statement: str, parameters) -> dict:
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        plan = result.scalar_one()
+        await conn.rollback()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def main(force: bool) -> int:
+    if not force:
+        print("Скрипт очищает таблицы users, lectures и lecture_registrations. Запустите с --force.")
+        return 2
+
+    await seed(engine, users=USERS, lectures=LECTURES, registrations=REGISTRATIONS)
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("SELECT relname, reltuples FROM pg_class WHERE relname IN ('users', 'lectures', 'lecture_registrations')")
+        )
+        large_tables = {row.relname for row in result if row.reltuples >= MIN_ROWS}
+
+    failures = 0
+    for name, max_queries, call in hot_calls():
+        try:
+            statements = await capture_statements(name, max_queries, call)
+        except AssertionError as e:
+            failures += 1
+            print(f"[FAIL] {e}")
+            continue
+
+        for statement, parameters in statements:
+            plan = await explain(statement, parameters)
+            bad = sorted(set(seq_scans(plan)) & large_tables)
+            status = "FAIL" if bad else "ok"
+            failures += bool(bad)
+            print(f"[{status}] {name}: {' '.join(statement.split())[:120]}")
+            if bad:
+                print(f"       Seq Scan по {', '.join(bad)}")
+
+    await engine.dispose()
+    print(f"\nТаблицы от {MIN_ROWS} строк: {', '.join(sorted(large_tables))}. Ошибок: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN-проверка горячих запросов BaseDAO")
+    parser.add_argument("--force", action="store_true", help="разрешить очистку и наполнение базы")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.force)))
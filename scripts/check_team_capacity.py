@@ -0,0 +1,121 @@
+"""
+Проверка лимита мест направления при одновременной регистрации команд.
+
+Создаёт направление на --places участников и одновременно регистрирует --teams команд
+по --size участников через BaseDAO.create_team (не более --concurrency в полёте).
+Каждый --overlap-й участник повторяет участника предыдущей команды, чтобы под нагрузкой
+проверялись и дубли. После прогона сверяет:
+
+    - участников в командах направления не больше max_peoples;
+    - счётчик registered_peoples равен фактическому числу участников;
+    - ни один telegram не встречается в направлении дважды;
+    - команд без участников нет.
+
+Завершается с кодом 1 при любом нарушении. Создаёт только своё направление и удаляет его после проверки.
+
+Запуск из корня репозитория (DATABASE_URL — локальная база с применёнными миграциями):
+
+    python -m scripts.check_team_capacity --places 100 --teams 200 --size 3
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, func, insert, select
+
+from database.dao import BaseDAO
+from database.db import engine
+from database.models import Category, Member, RegCommand
+
+
+def participants(team: int, args, run_id: str) -> list[dict]:
+    members = []
+    for i in range(args.size):
+        owner = team
+        # Каждый overlap-й участник уже заявлен в предыдущей команде
+        if args.overlap and i == 0 and team % args.overlap == 0 and team > 0:
+            owner = team - 1
+        members.append({"first_name": "Member", "last_name": f"{owner}-{i}", "telegram": f"{run_id}-{owner}-{i}"})
+    return members
+
+
+async def main(args) -> int:
+    # Ожидание блокировки направления под нагрузкой — ожидаемо, лог медленных запросов здесь лишний
+    logging.getLogger("database.profiling").setLevel(logging.ERROR)
+
+    run_id = uuid.uuid4().hex[:8]
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            insert(Category)
+            .values(name_category=f"Capacity check {run_id}", max_peoples=args.places)
+            .returning(Category.id)
+        )
+        category_id = result.scalar_one()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    statuses = Counter()
+
+    async def one(team: int):
+        async with semaphore:
+            result = await BaseDAO.create_team(f"Team {team}", category_id, participants(team, args, run_id))
+            statuses[result.status.value] += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(team) for team in range(args.teams)))
+        elapsed = time.perf_counter() - started
+
+        async with engine.connect() as conn:
+            counter = (await conn.execute(
+                select(Category.max_peoples, Category.registered_peoples).where(Category.id == category_id)
+            )).one()
+            telegrams = (await conn.execute(
+                select(Member.telegram)
+                .join(RegCommand, RegCommand.id == Member.command_id)
+                .where(RegCommand.category_id == category_id)
+            )).scalars().all()
+            empty_teams = (await conn.execute(
+                select(func.count())
+                .select_from(RegCommand)
+                .where(RegCommand.category_id == category_id, ~RegCommand.members.any())
+            )).scalar_one()
+    finally:
+        async with engine.begin() as conn:
+            teams = select(RegCommand.id).where(RegCommand.category_id == category_id)
+            await conn.execute(delete(Member).where(Member.command_id.in_(teams)))
+            await conn.execute(delete(RegCommand).where(RegCommand.category_id == category_id))
+            await conn.execute(delete(Category).where(Category.id == category_id))
+        await engine.dispose()
+
+    repeated = sum(count - 1 for count in Counter(telegrams).values() if count > 1)
+    problems = []
+    if len(telegrams) > counter.max_peoples:
+        problems.append(f"участников {len(telegrams)} > max_peoples {counter.max_peoples}")
+    if counter.registered_peoples != len(telegrams):
+        problems.append(f"registered_peoples {counter.registered_peoples} != участников {len(telegrams)}")
+    if repeated:
+        problems.append(f"повторных участников: {repeated}")
+    if empty_teams:
+        problems.append(f"команд без участников: {empty_teams}")
+
+    print(f"{args.teams} команд за {elapsed:.2f} с: {dict(statuses)}")
+    print(f"Участников {len(telegrams)} из {counter.max_peoples}, счётчик {counter.registered_peoples}")
+    for problem in problems:
+        print(f"[FAIL] {problem}")
+    if not problems:
+        print("[ok] лимит направления соблюдён")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка лимита мест направления при одновременной регистрации команд")
+    parser.add_argument("--places", type=int, default=100)
+    parser.add_argument("--teams", type=int, default=200)
+    parser.add_argument("--size", type=int, default=3)
+    parser.add_argument("--overlap", type=int, default=5, help="каждая overlap-я команда повторяет участника, 0 — без дублей")
+    parser.add_argument("--concurrency", type=int, default=50)
+    sys.exit(asyncio.run(main(parser.parse_args())))
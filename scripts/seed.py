@@ -0,0 +1,77 @@
+"""
+Наполнение локальной БД реалистичными объёмами данных для проверки планов запросов и нагрузочных тестов.
+
+ВНИМАНИЕ: перед наполнением таблицы users, lectures и lecture_registrations очищаются.
+Запускать только на локальной/тестовой базе.
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+async def seed(engine: AsyncEngine, users: int, lectures: int, registrations: int):
+    '''
+    Очищает таблицы и заполняет их через generate_series на стороне Postgres.
+
+    Аргументы:
+        - users: количество пользователей (username_tg = user<N>, user_tg = 100000000 + N)
+        - lectures: количество лекций, половина в прошлом, половина в будущем
+        - registrations: количество регистраций, равномерно распределённых по лекциям
+    '''
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE lecture_registrations, lectures, users RESTART IDENTITY CASCADE"))
+        await conn.execute(
+            text(
+                """
+                INSERT INTO users (user_name, user_tg, is_admin, score, username_tg)
+                SELECT 'User ' || i, (100000000 + i)::text, false, (i * 7919 % 1000)::float, 'user' || i
+                FROM generate_series(1, :users) AS i
+                """
+            ),
+            {"users": users},
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO lectures (title, speaker, date, end_time, max_seats, format,
+                                      conference_link, offline_map_link, registered_count)
+                SELECT 'Lecture ' || i,
+                       'Speaker ' || (i % 50),
+                       date_trunc('hour', now()) + (i - :lectures / 2) * interval '6 hours',
+                       date_trunc('hour', now()) + (i - :lectures / 2) * interval '6 hours' + interval '90 minutes',
+                       :seats,
+                       CASE WHEN i % 2 = 0 THEN 'online' ELSE 'offline' END,
+                       CASE WHEN i % 2 = 0 THEN 'https://meet.example.com/' || i END,
+                       CASE WHEN i % 2 = 1 THEN 'https://maps.example.com/' || i END,
+                       0
+                FROM generate_series(1, :lectures) AS i
+                """
+            ),
+            # Вместимость с запасом, чтобы все сгенерированные регистрации поместились
+            {"lectures": lectures, "seats": registrations // max(lectures, 1) * 2 + 10},
+        )
+        await conn.execute(
+            text(
+                """
+                INSERT INTO lecture_registrations (user_id, lecture_id)
+                SELECT r % :users + 1, (r / :users + r) % :lectures + 1
+                FROM generate_series(0, :registrations - 1) AS r
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            {"users": users, "lectures": lectures, "registrations": registrations},
+        )
+        await conn.execute(
+            text(
+                """
+                UPDATE lectures
+                SET registered_count = counts.total
+                FROM (SELECT lecture_id, count(*) AS total FROM lecture_registrations GROUP BY lecture_id) AS counts
+                WHERE lectures.id = counts.lecture_id
+                """
+            )
+        )
+
+    # Свежая статистика нужна планировщику, иначе EXPLAIN не отражает поведение на реальных объёмах
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("ANALYZE users, lectures, lecture_registrations"))
@@ -0,0 +1,169 @@
+import functools
+import hashlib
+import hmac
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from fastapi import Depends, Header, HTTPException
+
+from services.signing import SignedToken, load_secret
+
+# Токен бота, которым Telegram подписывает initData мини-приложения
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+# Сколько секунд после выдачи Telegram принимаем initData
+INIT_DATA_MAX_AGE = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))
+
+SESSION_SECRET = load_secret("SESSION_SECRET")
+
+# Время жизни сессии в секундах; снятие прав администратора вступает в силу не позже этого срока
+SESSION_TTL = int(os.getenv("SESSION_TTL", "43200"))
+
+
+class InvalidInitData(Exception):
+    '''
+    initData Telegram не прошли проверку.
+
+    Поля:
+        - reason: not_configured / malformed / bad_signature / expired
+    '''
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class InvalidSession(Exception):
+    '''
+    Сессионный токен не прошёл проверку.
+
+    Поля:
+        - reason: malformed / bad_signature / expired
+    '''
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+# user_id, is_admin, срок действия (unix time)
+_sessions = SignedToken(SESSION_SECRET, "IBI", InvalidSession)
+# Наибольший user_id, который помещается в токен (поле I — 32 бита без знака)
+_MAX_USER_ID = 2 ** 32 - 1
+
+
+@dataclass(frozen=True)
+class TelegramUser:
+    id: int
+    first_name: str
+    last_name: str
+    username: str
+
+
+@dataclass(frozen=True)
+class SessionUser:
+    user_id: int
+    is_admin: bool
+    expires: int
+
+
+@functools.lru_cache(maxsize=4)
+def _webapp_secret(bot_token: str) -> bytes:
+    '''Ключ проверки initData: HMAC-SHA256 токена бота с ключом "WebAppData". Считается один раз.'''
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def init_data_hash(fields: dict[str, str], bot_token: str = TELEGRAM_BOT_TOKEN) -> str:
+    '''Подпись initData по правилам Telegram: строки key=value без hash, отсортированные по ключу.'''
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()) if key != "hash")
+    return hmac.new(_webapp_secret(bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_init_data(init_data: str, now: Optional[float] = None) -> TelegramUser:
+    '''
+    Проверяет подпись и свежесть initData мини-приложения Telegram.
+
+    Возвращает:
+        Пользователя Telegram из поля user.
+
+    Выбрасывает:
+        InvalidInitData с причиной отказа.
+    '''
+    if not TELEGRAM_BOT_TOKEN:
+        raise InvalidInitData("not_configured")
+
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash or "user" not in fields:
+        raise InvalidInitData("malformed")
+    if not hmac.compare_digest(received_hash, init_data_hash(fields)):
+        raise InvalidInitData("bad_signature")
+
+    try:
+        auth_date = int(fields.get("auth_date", "0"))
+        user = json.loads(fields["user"])
+        telegram_user = TelegramUser(id=int(user["id"]),
+                                     first_name=user.get("first_name", ""),
+                                     last_name=user.get("last_name", ""),
+                                     username=user.get("username", ""))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidInitData("malformed")
+
+    now = time.time() if now is None else now
+    if now - auth_date > INIT_DATA_MAX_AGE:
+        raise InvalidInitData("expired")
+    return telegram_user
+
+
+def issue_session(user_id: int, is_admin: bool, ttl: int = SESSION_TTL) -> tuple[str, int]:
+    '''
+    Выпускает компактный подписанный токен сессии (35 символов base64url).
+
+    Возвращает:
+        (токен, срок действия в unix time).
+
+    Выбрасывает:
+        ValueError, если user_id не помещается в токен.
+    '''
+    if not 0 < user_id <= _MAX_USER_ID:
+        raise ValueError(f"user_id вне допустимого диапазона: {user_id}")
+    expires = int(time.time()) + ttl
+    return _sessions.issue(user_id, int(is_admin), expires), expires
+
+
+def verify_session(token: str, now: Optional[float] = None) -> SessionUser:
+    '''
+    Проверяет подпись и срок действия токена сессии без обращения к БД.
+
+    Выбрасывает:
+        InvalidSession с причиной отказа.
+    '''
+    user_id, is_admin, expires = _sessions.verify(token)
+
+    now = time.time() if now is None else now
+    if now > expires:
+        raise InvalidSession("expired")
+    return SessionUser(user_id=user_id, is_admin=bool(is_admin), expires=expires)
+
+
+async def get_current_user(authorization: Optional[str] = Header(default=None)) -> SessionUser:
+    '''Зависимость FastAPI: пользователь из заголовка Authorization: Bearer <токен сессии>.'''
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Требуется авторизация",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return verify_session(token)
+    except InvalidSession as e:
+        raise HTTPException(status_code=401, detail=f"Недействительная сессия: {e.reason}",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+async def require_admin(user: SessionUser = Depends(get_current_user)) -> SessionUser:
+    '''Зависимость FastAPI: только для администраторов.'''
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ только для администраторов")
+    return user
@@ -0,0 +1,92 @@
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from typing import AsyncIterator, Sequence
+
+import xlsxwriter
+from fastapi.responses import StreamingResponse
+
+# Строк на одну выборку серверного курсора и один чанк ответа
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_CHUNK_SIZE = 256 * 1024
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+REGISTRATION_COLUMNS = ("registration_id", "lecture_id", "lecture_title", "lecture_date", "user_id",
+                        "user_name", "user_tg", "username_tg", "checked_in_at")
+TEAM_COLUMNS = ("team_id", "team_name", "category", "member_id", "first_name", "last_name", "telegram")
+
+# Excel исполняет значения ячеек CSV, начинающиеся с этих символов, как формулы
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_value(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+async def csv_chunks(columns: Sequence[str], batches: AsyncIterator[Sequence[Sequence]]) -> AsyncIterator[bytes]:
+    '''CSV в UTF-8 с BOM (его ждёт Excel): заголовок и по чанку на каждую пачку строк.'''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    async for rows in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _write_rows(worksheet, first_row: int, rows: Sequence[Sequence]):
+    for offset, row in enumerate(rows):
+        worksheet.write_row(first_row + offset, 0, row)
+
+
+async def xlsx_chunks(columns: Sequence[str], batches: AsyncIterator[Sequence[Sequence]]) -> AsyncIterator[bytes]:
+    '''
+    XLSX из пачек строк. Книга в режиме constant_memory сбрасывает каждую строку во временный файл,
+    поэтому память не зависит от числа строк; архив XLSX собирается в конце и отдаётся с диска чанками.
+    Запись идёт в потоке, чтобы не блокировать цикл событий.
+    '''
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm",
+            # Имена и username пользователей не должны превращаться в формулы и ссылки
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        })
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, columns, workbook.add_format({"bold": True}))
+        next_row = 1
+        async for rows in batches:
+            await asyncio.to_thread(_write_rows, worksheet, next_row, rows)
+            next_row += len(rows)
+        await asyncio.to_thread(workbook.close)
+
+        file = await asyncio.to_thread(open, path, "rb")
+        try:
+            while chunk := await asyncio.to_thread(file.read, EXPORT_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+    finally:
+        await asyncio.to_thread(os.remove, path)
+
+
+def export_response(fmt: str, file_name: str, columns: Sequence[str],
+                    batches: AsyncIterator[Sequence[Sequence]]) -> StreamingResponse:
+    '''Потоковый ответ с выгрузкой в формате fmt (csv или xlsx) как вложение file_name.<fmt>.'''
+    if fmt == "xlsx":
+        body, media_type = xlsx_chunks(columns, batches), XLSX_MEDIA_TYPE
+    else:
+        body, media_type = csv_chunks(columns, batches), "text/csv; charset=utf-8"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{file_name}.{fmt}"'})
@@ -0,0 +1,13 @@
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''
+    Проверяет заголовок If-None-Match против текущего ETag (слабое сравнение, как требует RFC 9110).
+    '''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
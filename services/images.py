@@ -0,0 +1,92 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from services.storage import UPLOAD_DIR, UPLOAD_URL_PREFIX, local_path
+
+# Ширины производных изображений: 160 — миниатюра для списка, остальные — для всплывающего окна карты
+PHOTO_WIDTHS = (160, 480, 960)
+# Форматы производных: WebP для клиентов, которые его принимают, JPEG — для остальных
+PHOTO_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _render_variants(source_path: str, stem: str) -> list[dict]:
+    '''
+    Строит производные изображения. Выполняется в отдельном процессе.
+
+    Возвращает:
+        Список вариантов: width, height, format, path (публичный путь /uploads/...).
+    '''
+    variants = []
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    # Не увеличиваем фото: ширины больше исходной пропускаем, но хотя бы миниатюру строим всегда
+    widths = [width for width in PHOTO_WIDTHS if width <= image.width] or [PHOTO_WIDTHS[0]]
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, options in PHOTO_FORMATS.items():
+            file_name = f"{stem}_{width}.{extension}"
+            temp_path = os.path.join(UPLOAD_DIR, f"{file_name}.part")
+            resized.save(temp_path, **options)
+            os.replace(temp_path, os.path.join(UPLOAD_DIR, file_name))
+            variants.append({
+                "width": width,
+                "height": height,
+                "format": extension,
+                "path": f"{UPLOAD_URL_PREFIX}{file_name}",
+            })
+    return variants
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: форк процесса с работающим циклом событий и пулом соединений небезопасен
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+async def build_variants(public_path: str) -> list[dict]:
+    '''Строит производные для загруженного фото в пуле процессов, не блокируя цикл событий.'''
+    stem = os.path.splitext(os.path.basename(public_path))[0]
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _render_variants, local_path(public_path), stem)
+
+
+def select_variant(variants: Optional[list[dict]], width: Optional[int], accept_webp: bool) -> Optional[dict]:
+    '''
+    Выбирает самый маленький вариант, который не уже запрошенной ширины.
+    Если такого нет — самый большой из доступных. Без width возвращается самый большой вариант.
+    '''
+    allowed = {"webp", "jpeg"} if accept_webp else {"jpeg"}
+    candidates = sorted(
+        (variant for variant in variants or [] if variant["format"] in allowed),
+        # При равной ширине WebP легче JPEG
+        key=lambda variant: (variant["width"], variant["format"] != "webp"),
+    )
+    if not candidates:
+        return None
+    if width is not None:
+        for variant in candidates:
+            if variant["width"] >= width:
+                return variant
+    return max(candidates, key=lambda variant: (variant["width"], variant["format"] == "webp"))
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
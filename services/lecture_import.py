@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+import os
+
+from pydantic import ValidationError
+
+from schemas.admin_schemas import LectureImportError
+from schemas.lecture_schemas import LectureIn
+
+# Больше лекций за раз не импортируем: весь пакет валидируется в памяти и пишется одним INSERT
+LECTURE_IMPORT_MAX_ROWS = int(os.getenv("LECTURE_IMPORT_MAX_ROWS", "1000"))
+
+
+class InvalidImport(ValueError):
+    '''Пакет нельзя разобрать целиком: неизвестный формат, повреждённый JSON/CSV или слишком много строк.'''
+
+
+def parse_records(body: bytes, content_type: str) -> list[dict]:
+    '''
+    Разбирает тело запроса: JSON-массив объектов (application/json) или CSV с заголовком
+    (text/csv, кодировка UTF-8, BOM допускается). Пустые ячейки CSV считаются отсутствующими значениями.
+
+    Выбрасывает:
+        InvalidImport, если тело не разбирается или строк больше LECTURE_IMPORT_MAX_ROWS.
+    '''
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type == "application/json":
+        try:
+            records = json.loads(body)
+        except ValueError as e:
+            raise InvalidImport(f"Некорректный JSON: {e}")
+        if not isinstance(records, list):
+            raise InvalidImport("Ожидается JSON-массив лекций")
+    elif media_type == "text/csv":
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # Лишние ячейки без заголовка DictReader кладёт под ключ None — их отбрасываем
+            records = [{key: value or None for key, value in row.items() if key is not None} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise InvalidImport(f"Некорректный CSV: {e}")
+    else:
+        raise InvalidImport(f"Неподдерживаемый тип данных: {media_type or 'не указан'}")
+
+    if not records:
+        raise InvalidImport("Пустой пакет")
+    if len(records) > LECTURE_IMPORT_MAX_ROWS:
+        raise InvalidImport(f"Не больше {LECTURE_IMPORT_MAX_ROWS} лекций за раз")
+    return records
+
+
+def validate_lectures(records: list) -> tuple[list[LectureIn], list[LectureImportError]]:
+    '''
+    Проверяет весь пакет до записи. Ошибки собираются по всем строкам сразу;
+    row — номер лекции в пакете, начиная с 1.
+
+    Возвращает:
+        (проверенные лекции, ошибки); при непустых ошибках пакет не записывается.
+    '''
+    lectures = []
+    errors = []
+    for row, record in enumerate(records, start=1):
+        try:
+            lectures.append(LectureIn.model_validate(record))
+        except ValidationError as e:
+            for error in e.errors(include_url=False):
+                errors.append(LectureImportError(row=row,
+                                                 field=".".join(str(part) for part in error["loc"]) or None,
+                                                 message=error["msg"]))
+    return lectures, errors
@@ -0,0 +1,207 @@
+import functools
+import glob
+import inspect
+import logging
+import os
+import re
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client import REGISTRY
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database.profiling import current_dao_method
+
+logger = logging.getLogger(__name__)
+
+# При нескольких воркерах uvicorn PROMETHEUS_MULTIPROC_DIR должен указывать на пустой каталог,
+# общий для всех воркеров, и быть задан до запуска: тогда /metrics суммирует значения всех процессов
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Границы корзин в секундах: от быстрых ответов из кэша до таймаута пула соединений
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+# Потоки событий (SSE) живут минутами: в гистограмму задержек они не попадают
+STREAMING_CONTENT_TYPE = b"text/event-stream"
+
+# Файлы livesum/liveall-гаугов процесса: gauge_livesum_<pid>.db
+_LIVE_GAUGE_FILE_RE = re.compile(r"gauge_live\w+?_(\d+)\.db$")
+
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status code",
+    ["method", "route", "status"],
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP requests being processed by route",
+    ["method", "route"], multiprocess_mode="livesum",
+)
+http_request_errors = Counter(
+    "http_request_errors_total", "HTTP requests that failed with an exception or a 5xx status",
+    ["method", "route"],
+)
+
+dao_duration = Histogram(
+    "dao_call_duration_seconds", "BaseDAO method latency",
+    ["method"], buckets=LATENCY_BUCKETS,
+)
+dao_in_progress = Gauge(
+    "dao_calls_in_progress", "BaseDAO calls being executed",
+    ["method"], multiprocess_mode="livesum",
+)
+dao_errors = Counter(
+    "dao_call_errors_total", "BaseDAO calls that raised an exception",
+    ["method", "exception"],
+)
+
+
+def _route_template(scope: Scope) -> str:
+    '''
+    Шаблон пути маршрута (/user/lections/{id}), а не сам путь — так число рядов метрик
+    не зависит от параметров запроса. Неизвестные пути сводятся в один ряд.
+    '''
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match is not Match.NONE:
+            return getattr(route, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    '''
+    ASGI-middleware: гистограмма задержек, число запросов в обработке и ошибки по маршрутам.
+    Работает на уровне ASGI, без BaseHTTPMiddleware, чтобы не добавлять задач и копий тела ответа.
+    '''
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_template(scope)
+        status_code = 500
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                content_type = dict(message.get("headers", ())).get(b"content-type", b"")
+                streaming = content_type.startswith(STREAMING_CONTENT_TYPE)
+            await send(message)
+
+        in_progress = http_requests_in_progress.labels(method, route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            status_code = 500
+            raise
+        finally:
+            if not streaming:
+                http_request_duration.labels(method, route).observe(time.perf_counter() - started)
+            http_requests.labels(method, route, str(status_code)).inc()
+            if status_code >= 500:
+                http_request_errors.labels(method, route).inc()
+            in_progress.dec()
+
+
+def observe_dao(func):
+    '''Декоратор метода BaseDAO: время выполнения, число вызовов в работе и исключения.'''
+    name = func.__name__
+    duration = dao_duration.labels(name)
+    in_progress = dao_in_progress.labels(name)
+
+    if inspect.isasyncgenfunction(func):
+        # Выгрузки: время считается до конца итерации. current_dao_method не ставится —
+        # генератор дочитывают через yield уже в контексте ответа
+        @functools.wraps(func)
+        async def generator_wrapper(*args, **kwargs):
+            in_progress.inc()
+            started = time.perf_counter()
+            try:
+                async for item in func(*args, **kwargs):
+                    yield item
+            except Exception as e:
+                dao_errors.labels(name, type(e).__name__).inc()
+                raise
+            finally:
+                duration.observe(time.perf_counter() - started)
+                in_progress.dec()
+
+        return generator_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        in_progress.inc()
+        # Имя метода попадает в лог медленных запросов (database.profiling)
+        token = current_dao_method.set(name)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            dao_errors.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+            current_dao_method.reset(token)
+            in_progress.dec()
+
+    return wrapper
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def mark_dead_workers():
+    '''
+    Удаляет из PROMETHEUS_MULTIPROC_DIR файлы livesum-гаугов завершившихся процессов.
+    Иначе значения «в обработке» упавших воркеров навсегда остаются в сумме.
+    У uvicorn нет хука завершения дочернего процесса, поэтому каждый воркер при старте
+    убирает файлы мёртвых процессов, а при штатной остановке — свои (mark_worker_stopped).
+    '''
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return
+    for path in glob.glob(os.path.join(PROMETHEUS_MULTIPROC_DIR, "gauge_live*.db")):
+        match = _LIVE_GAUGE_FILE_RE.search(os.path.basename(path))
+        if match is None:
+            continue
+        pid = int(match.group(1))
+        if pid != os.getpid() and not _process_alive(pid):
+            multiprocess.mark_process_dead(pid, PROMETHEUS_MULTIPROC_DIR)
+            logger.info(f'Удалены метрики завершившегося воркера {pid}')
+
+
+def mark_worker_stopped():
+    '''Удаляет файлы livesum-гаугов текущего процесса при штатной остановке воркера.'''
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid(), PROMETHEUS_MULTIPROC_DIR)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    '''Метрики в текстовом формате Prometheus; в многопроцессном режиме — суммарно по всем воркерам.'''
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
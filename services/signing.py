@@ -0,0 +1,81 @@
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import struct
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SIZE = 16
+
+
+def load_secret(env_name: str) -> bytes:
+    '''
+    Секрет подписи из переменной окружения env_name. Если он не задан, берётся случайный секрет
+    процесса: токены, выданные одним воркером, тогда не проверятся на другом.
+    '''
+    secret = os.getenv(env_name, "").encode()
+    if not secret:
+        logger.warning(f'{env_name} не задан, используется случайный секрет процесса')
+        secret = secrets.token_bytes(32)
+    return secret
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SignedToken:
+    '''
+    Компактный подписанный токен: байт версии и поля fields (формат struct, big-endian),
+    за ними усечённый HMAC-SHA256, всё в base64url без выравнивания.
+
+    Ошибки проверки выбрасываются как error(reason) с причиной malformed / bad_signature,
+    чтобы у билетов и сессий оставались свои типы исключений.
+    '''
+
+    def __init__(self, secret: bytes, fields: str, error: type[Exception],
+                 version: int = 1, signature_size: int = SIGNATURE_SIZE):
+        self.secret = secret
+        self.error = error
+        self.version = version
+        self.signature_size = signature_size
+        self._payload = struct.Struct(">B" + fields)
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:self.signature_size]
+
+    def issue(self, *values: int) -> str:
+        '''
+        Выбрасывает:
+            ValueError, если значение не помещается в своё поле.
+        '''
+        try:
+            payload = self._payload.pack(self.version, *values)
+        except struct.error as e:
+            raise ValueError(f"Поля токена вне допустимого диапазона: {e}")
+        return _b64encode(payload + self._sign(payload))
+
+    def verify(self, token: str) -> tuple:
+        '''Проверяет подпись и версию; возвращает поля без версии. Срок действия проверяет вызывающий код.'''
+        try:
+            raw = _b64decode(token.strip())
+        except (ValueError, UnicodeEncodeError):
+            raise self.error("malformed")
+        if len(raw) != self._payload.size + self.signature_size:
+            raise self.error("malformed")
+
+        payload, signature = raw[:self._payload.size], raw[self._payload.size:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise self.error("bad_signature")
+
+        version, *values = self._payload.unpack(payload)
+        if version != self.version:
+            raise self.error("malformed")
+        return tuple(values)
@@ -0,0 +1,261 @@
+import asyncio
+import os
+import re
+import tempfile
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.responses import FileResponse, ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from services.http_cache import etag_matches
+
+# Каталог с загруженными файлами; в БД хранятся публичные пути вида /uploads/<uuid>.<ext>
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_URL_PREFIX = "/uploads/"
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Запас на границы и заголовки частей multipart поверх самого файла
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Имена файлов — UUID, поэтому содержимое по одному адресу никогда не меняется
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UPLOAD_NAME_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(_\d+)?\.(jpg|jpeg|png|webp)$")
+
+# Разрешённые типы изображений и расширение, под которым сохраняется файл
+ALLOWED_IMAGE_TYPES = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+
+class UploadRejected(Exception):
+    '''
+    Загрузка отклонена до сохранения файла.
+
+    Поля:
+        - status_code: HTTP-код для ответа (413 — слишком большой файл, 415 — неподдерживаемый тип)
+    '''
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _sniff_image_type(head: bytes) -> Optional[str]:
+    '''Определяет тип изображения по сигнатуре первых байт, не доверяя заголовку клиента.'''
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def local_path(public_path: str) -> str:
+    '''Путь на диске для публичного пути /uploads/<имя>. Каталоги из имени отбрасываются.'''
+    return os.path.join(UPLOAD_DIR, os.path.basename(public_path))
+
+
+def _open_temp_file() -> tuple[int, str]:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Временный файл в том же каталоге, чтобы os.replace был атомарным переименованием
+    return tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(upload: UploadFile) -> str:
+    '''
+    Потоково сохраняет загруженное изображение в UPLOAD_DIR, не блокируя цикл событий.
+
+    К этому моменту Starlette уже разобрал multipart-форму во временный файл, поэтому тело
+    запроса ограничивает UploadLimitMiddleware ещё при чтении. Здесь проверяются заявленный
+    Content-Type и размер, сигнатура файла по первому чанку и общий объём по мере копирования.
+    Файл пишется во временный *.part и атомарно переименовывается в <uuid>.<ext>.
+
+    Возвращает:
+        Публичный путь вида /uploads/<uuid>.<ext>.
+
+    Выбрасывает:
+        UploadRejected, если файл слишком большой или не является поддерживаемым изображением.
+    '''
+    if upload.content_type not in ALLOWED_IMAGE_TYPES:
+        raise UploadRejected(f"Неподдерживаемый тип файла: {upload.content_type}", 415)
+    if upload.size is not None and upload.size > UPLOAD_MAX_BYTES:
+        raise UploadRejected("Файл слишком большой", 413)
+
+    fd, temp_path = await asyncio.to_thread(_open_temp_file)
+    file = os.fdopen(fd, "wb")
+    try:
+        content_type = None
+        written = 0
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            if content_type is None:
+                content_type = _sniff_image_type(chunk)
+                if content_type is None:
+                    raise UploadRejected("Файл не является изображением JPEG, PNG или WebP", 415)
+            written += len(chunk)
+            if written > UPLOAD_MAX_BYTES:
+                raise UploadRejected("Файл слишком большой", 413)
+            await asyncio.to_thread(file.write, chunk)
+
+        if content_type is None:
+            raise UploadRejected("Пустой файл", 415)
+
+        await asyncio.to_thread(file.close)
+        file_name = f"{uuid.uuid4()}.{ALLOWED_IMAGE_TYPES[content_type]}"
+        await asyncio.to_thread(os.replace, temp_path, os.path.join(UPLOAD_DIR, file_name))
+        return f"{UPLOAD_URL_PREFIX}{file_name}"
+    except BaseException:
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(_discard, temp_path)
+        raise
+
+
+class UploadLimitMiddleware:
+    '''
+    Ограничивает тело multipart-запросов размером UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+    до того, как Starlette разберёт форму во временный файл.
+
+    Запрос с большим Content-Length отклоняется сразу, без чтения тела. Если длина не указана
+    (chunked), байты считаются по мере чтения: после превышения приложение получает
+    http.disconnect, а его ответ заменяется на 413.
+    '''
+
+    def __init__(self, app: ASGIApp, max_body: int = UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD):
+        self.app = app
+        self.max_body = max_body
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        too_large = self._reject(scope, receive, send)
+        try:
+            declared = int(headers.get(b"content-length", b"0"))
+        except ValueError:
+            declared = 0
+        if declared > self.max_body:
+            await too_large()
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message):
+            # Ответ приложения на оборванное тело подменяется одним ответом 413
+            if not exceeded:
+                await send(message)
+            elif message["type"] == "http.response.start":
+                await too_large()
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    def _reject(self, scope: Scope, receive: Receive, send: Send):
+        async def respond():
+            response = ORJSONResponse(status_code=413, content={"detail": "Файл слишком большой"})
+            await response(scope, receive, send)
+        return respond
+
+
+async def remove_upload(public_path: Optional[str]):
+    '''Удаляет загруженный файл в фоновом потоке. Отсутствующий файл не считается ошибкой.'''
+    if public_path and public_path.startswith(UPLOAD_URL_PREFIX):
+        await asyncio.to_thread(_discard, local_path(public_path))
+
+
+class UploadFileResponse(FileResponse):
+    '''
+    FileResponse, который отдаёт файл через sendfile, если ASGI-сервер поддерживает
+    расширение http.response.zerocopysend. Иначе — обычная потоковая отдача
+    крупными чанками (в том числе для Range-запросов и HEAD).
+    '''
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        headers = dict(scope.get("headers", []))
+        if not zerocopy or scope["method"].upper() != "GET" or b"range" in headers:
+            await super().__call__(scope, receive, send)
+            return
+
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.zerocopysend", "file": file})
+        finally:
+            await asyncio.to_thread(file.close)
+
+
+def _strong_etag(file_name: str, stat_result: os.stat_result) -> str:
+    return f'"{os.path.splitext(file_name)[0]}-{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+async def serve_upload(public_path: str, request: Request, cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    '''
+    Отдаёт загруженный файл с ETag/Last-Modified, поддержкой If-None-Match/If-Modified-Since
+    (ответ 304 без чтения файла) и Range-запросов.
+
+    Выбрасывает:
+        HTTPException 404, если имя файла некорректно или файла нет.
+    '''
+    file_name = os.path.basename(public_path)
+    if not UPLOAD_NAME_RE.match(file_name):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+    path = local_path(file_name)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Файл не найден")
+
+    headers = {
+        "ETag": _strong_etag(file_name, stat_result),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        not_modified = etag_matches(if_none_match, headers["ETag"])
+    elif if_modified_since is not None:
+        try:
+            not_modified = int(stat_result.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            not_modified = False
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    return UploadFileResponse(path, stat_result=stat_result, headers=headers)
@@ -0,0 +1,163 @@
+import asyncio
+import io
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import qrcode
+from qrcode.image.pil import PilImage
+from qrcode.image.svg import SvgPathImage
+
+from services.signing import SignedToken, load_secret
+
+TICKET_SECRET = load_secret("TICKET_SECRET")
+
+# Сколько билет действует после окончания лекции, в секундах
+TICKET_GRACE_SECONDS = int(os.getenv("TICKET_GRACE_SECONDS", "3600"))
+QR_CACHE_SIZE = int(os.getenv("QR_CACHE_SIZE", "20000"))
+# Сколько секунд выданный билет отдаётся из кэша без сверки с БД. Отмену регистрации, удаление
+# и перенос лекции в своём воркере кэш видит сразу, в остальных воркерах — не позже этого срока
+QR_CACHE_RECHECK = float(os.getenv("QR_CACHE_RECHECK", "60"))
+
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+class InvalidTicket(Exception):
+    '''
+    Билет не прошёл проверку.
+
+    Поля:
+        - reason: malformed / bad_signature / not_yet_valid / expired
+    '''
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@dataclass(frozen=True)
+class TicketClaims:
+    user_id: int
+    lecture_id: int
+    not_before: int
+    expires: int
+
+
+# user_id, lecture_id, начало и конец действия (unix time)
+_tickets = SignedToken(TICKET_SECRET, "IIII", InvalidTicket)
+
+
+def issue_ticket(user_id: int, lecture_id: int, not_before: int, expires: int) -> str:
+    '''Выпускает компактный подписанный билет (44 символа base64url).'''
+    return _tickets.issue(user_id, lecture_id, not_before, expires)
+
+
+def verify_ticket(token: str, now: Optional[float] = None) -> TicketClaims:
+    '''
+    Проверяет подпись и срок действия билета без обращения к БД.
+
+    Выбрасывает:
+        InvalidTicket с причиной отказа.
+    '''
+    user_id, lecture_id, not_before, expires = _tickets.verify(token)
+
+    now = time.time() if now is None else now
+    if now < not_before:
+        raise InvalidTicket("not_yet_valid")
+    if now > expires:
+        raise InvalidTicket("expired")
+    return TicketClaims(user_id=user_id, lecture_id=lecture_id, not_before=not_before, expires=expires)
+
+
+def _render(token: str, fmt: str) -> bytes:
+    if fmt == "svg":
+        return qrcode.make(token, image_factory=SvgPathImage).to_string()
+    buffer = io.BytesIO()
+    qrcode.make(token, image_factory=PilImage, box_size=8, border=2).save(buffer)
+    return buffer.getvalue()
+
+
+async def render_qr(token: str, fmt: str = "png") -> bytes:
+    '''Рисует QR-код билета в PNG или SVG вне цикла событий.'''
+    return await asyncio.to_thread(_render, token, fmt)
+
+
+@dataclass(frozen=True)
+class RenderedTicket:
+    token: str
+    image: bytes
+    media_type: str
+    not_before: int
+    expires: int
+    # Момент (time.monotonic) последней сверки регистрации и времени лекции с БД
+    checked_at: float
+
+    def confirmed(self) -> "RenderedTicket":
+        return replace(self, checked_at=time.monotonic())
+
+
+class TicketCache:
+    '''
+    LRU-кэш выпущенных билетов с готовыми картинками по ключу (user_id, lecture_id, формат).
+
+    В течение recheck секунд после сверки с БД повторное открытие QR не требует ни запросов
+    к БД, ни отрисовки. Потом билет сверяется с БД одним запросом: если регистрация на месте
+    и окно действия не изменилось, картинка переиспользуется без отрисовки.
+    '''
+
+    def __init__(self, maxsize: int = QR_CACHE_SIZE, recheck: float = QR_CACHE_RECHECK):
+        self.maxsize = maxsize
+        self.recheck = recheck
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[int, int, str], RenderedTicket] = OrderedDict()
+
+    def peek(self, user_id: int, lecture_id: int, fmt: str) -> Optional[RenderedTicket]:
+        '''Непросроченный билет из кэша, даже если его пора сверить с БД.'''
+        key = (user_id, lecture_id, fmt)
+        ticket = self._entries.get(key)
+        if ticket is None or ticket.expires < time.time():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return ticket
+
+    def get(self, user_id: int, lecture_id: int, fmt: str) -> Optional[RenderedTicket]:
+        '''Билет, который можно отдать без обращения к БД, или None.'''
+        ticket = self.peek(user_id, lecture_id, fmt)
+        if ticket is None or time.monotonic() - ticket.checked_at >= self.recheck:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return ticket
+
+    def put(self, user_id: int, lecture_id: int, fmt: str, ticket: RenderedTicket):
+        self._entries[(user_id, lecture_id, fmt)] = ticket
+        self._entries.move_to_end((user_id, lecture_id, fmt))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def discard(self, user_id: int, lecture_id: int):
+        for fmt in QR_MEDIA_TYPES:
+            self._entries.pop((user_id, lecture_id, fmt), None)
+
+    def discard_lecture(self, lecture_id: int):
+        '''Сбрасывает билеты всех пользователей на лекцию (удаление или перенос лекции).'''
+        for key in [key for key in self._entries if key[1] == lecture_id]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "recheck": self.recheck,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+ticket_cache = TicketCache()